@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Bulk classification of image directories with streaming, resumable output.
+
+Directories are walked lazily with os.scandir and images are classified in
+batches. Each batch's results are appended to a JSONL or CSV file as soon as
+they are ready, and a checkpoint records which files are done, so a killed run
+picks up where it left off instead of reclassifying finished files.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import torch
+import metrics
+from inference import Classifier, check_top_k
+
+# Same formats the GUI's file dialog offers
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+
+
+def iter_image_files(root, extensions=IMAGE_EXTENSIONS):
+    """Yield image paths under root one directory at a time, without listing the whole tree."""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith(extensions) and entry.is_file():
+                        yield entry.path
+        except OSError as e:
+            print(f"✗ Skipping unreadable directory {directory}: {e}")
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items from iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Checkpoint:
+    """Append-only record of processed files and the matching results-file size.
+
+    Each line is a JSON object {"offset": ..., "paths": [...]} written after the
+    results for those paths have been flushed. On resume, the results file is
+    truncated back to the last recorded offset, dropping any rows written after
+    the final checkpoint so they aren't duplicated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.processed = set()  # Files finished by earlier runs; the walk never repeats a path
+        self.offset = 0
+
+    def load(self):
+        """Read previous progress; a torn final line from a crash is ignored."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.processed.update(record['paths'])
+                self.offset = record['offset']
+
+    def record(self, paths, offset):
+        """Durably mark paths as done once the results file has reached offset."""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'offset': offset, 'paths': paths}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.offset = offset
+
+
+class ResultWriter:
+    """Stream result rows to a JSONL or CSV file."""
+
+    def __init__(self, path, fmt='jsonl', top_k=1, resume_offset=0):
+        if fmt not in ('jsonl', 'csv'):
+            raise ValueError(f"Unsupported output format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.top_k = top_k
+        if resume_offset:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < resume_offset:
+                raise ValueError(
+                    f"{path} is missing or shorter than the checkpoint says ({size} < {resume_offset} bytes); "
+                    "run with --restart to start over"
+                )
+        mode = 'r+' if resume_offset else 'w'
+        self.file = open(path, mode, encoding='utf-8', newline='')
+        self.file.seek(resume_offset)
+        self.file.truncate()
+        if fmt == 'csv':
+            self.csv_writer = csv.writer(self.file)
+            if resume_offset == 0:
+                self.csv_writer.writerow(self.csv_header())
+
+    def csv_header(self):
+        columns = ['path']
+        for rank in range(1, self.top_k + 1):
+            columns += [f'label_{rank}', f'confidence_{rank}']
+        return columns + ['preprocess_ms', 'inference_ms', 'error']
+
+    def write_rows(self, rows):
+        """Append rows, flush them to disk and return the new file offset."""
+        for row in rows:
+            if self.fmt == 'jsonl':
+                self.file.write(json.dumps(row) + '\n')
+            else:
+                values = [row['path']]
+                predictions = row.get('top_k', [])
+                for rank in range(self.top_k):
+                    if rank < len(predictions):
+                        values += [predictions[rank]['label'], f"{predictions[rank]['confidence']:.6f}"]
+                    else:
+                        values += ['', '']
+                values += [row.get('preprocess_ms', ''), row.get('inference_ms', ''), row.get('error', '')]
+                self.csv_writer.writerow(values)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def classify_batch(classifier, paths, top_k=1):
+    """Classify a batch of files and return one result row per path.
+
+    Files that fail to open or decode get a row with an error instead of
+    failing the whole batch. Timings are per image, amortized over the batch.
+    """
+    start = time.perf_counter()
+    tensors, good_paths, rows = [], [], []
+    for path in paths:
+        metrics.REQUESTS.labels(source='bulk').inc()
+        try:
+            tensors.append(classifier.preprocess(classifier.load_image(path)))
+            good_paths.append(path)
+        except Exception as e:
+            metrics.ERRORS.labels(source='bulk').inc()
+            rows.append({'path': path, 'error': str(e)})
+    preprocess_ms = (time.perf_counter() - start) * 1000 / max(1, len(good_paths))
+
+    if tensors:
+        start = time.perf_counter()
+        predictions = classifier.predict_batch(torch.stack(tensors), top_k)
+        inference_ms = (time.perf_counter() - start) * 1000 / len(tensors)
+        for path, top in zip(good_paths, predictions):
+            rows.append({
+                'path': path,
+                'top_k': [{'label': label, 'confidence': confidence} for label, confidence in top],
+                'preprocess_ms': round(preprocess_ms, 3),
+                'inference_ms': round(inference_ms, 3),
+            })
+    return rows
+
+
+def run(classifier, roots, output, fmt='jsonl', top_k=1, checkpoint_path=None, resume=True):
+    """Classify every image under roots, streaming results to output."""
+    check_top_k(top_k, len(classifier.class_names))
+    checkpoint = Checkpoint(checkpoint_path or output + '.checkpoint')
+    if resume:
+        checkpoint.load()
+    elif os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    if checkpoint.processed:
+        print(f"Resuming: {len(checkpoint.processed)} files already processed")
+
+    def pending_files():
+        for root in roots:
+            for path in iter_image_files(root):
+                if path not in checkpoint.processed:
+                    yield path
+
+    writer = ResultWriter(output, fmt, top_k, resume_offset=checkpoint.offset)
+    processed = failed = 0
+    started = time.perf_counter()
+    try:
+        for batch_number, paths in enumerate(batched(pending_files(), classifier.batch_size), 1):
+            rows = classify_batch(classifier, paths, top_k)
+            offset = writer.write_rows(rows)
+            checkpoint.record(paths, offset)
+            processed += len(paths)
+            failed += sum(1 for row in rows if 'error' in row)
+            if batch_number % 50 == 0:
+                rate = processed / (time.perf_counter() - started)
+                print(f"Processed {processed} files ({rate:.1f} img/s)")
+    finally:
+        writer.close()
+    return processed, failed
+
+
+def main():
+    """Classify image directories in bulk."""
+    parser = argparse.ArgumentParser(description="Classify every image under one or more directories")
+    parser.add_argument('directories', nargs='+')
+    parser.add_argument('-o', '--output', default='results.jsonl')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default=None,
+                        help="output format (default: from the output file extension)")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--checkpoint', default=None, help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument('--restart', action='store_true', help="ignore any previous checkpoint and start over")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help="address for the metrics endpoint (0.0.0.0 for all interfaces)")
+    parser.add_argument('--metrics-file', help="periodically write Prometheus metrics to this file")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port, args.metrics_host)
+    if args.metrics_file:
+        metrics.start_textfile_writer(args.metrics_file)
+
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+
+    print("Image Recognition App - Bulk Classification")
+    print("=" * 60)
+
+    classifier = Classifier()
+    try:
+        processed, failed = run(classifier, args.directories, args.output, fmt, args.top_k,
+                                args.checkpoint, resume=not args.restart)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+
+    if args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
+
+    print("=" * 60)
+    print(f"Classified {processed - failed} files, {failed} failed")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
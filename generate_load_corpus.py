@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Script to generate large synthetic image corpora for load testing.
+
+Unlike create_test_images.py, which draws a handful of fixed shapes, this
+produces any number of images from a deterministic seed, with configurable
+distributions of resolution, format, JPEG quality and EXIF orientation. Pixel
+data is generated with vectorized NumPy, generation runs in parallel across
+processes, and images can also be streamed in memory without touching disk.
+Everything works offline.
+
+Image i depends only on the seed and i, so any slice of the corpus can be
+regenerated on its own and the output doesn't depend on the process count.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, features
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+EXTENSIONS = {'jpeg': '.jpg', 'png': '.png', 'bmp': '.bmp', 'webp': '.webp'}
+
+# Images per subdirectory, so millions of files don't land in one directory
+FILES_PER_SHARD = 1000
+
+
+def parse_weighted(text, convert=str):
+    """Parse 'value:weight,value:weight' into (values, probabilities).
+
+    The weight is optional and defaults to 1, e.g. 'jpeg:8,png' is 8:1.
+    """
+    values, weights = [], []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        value, _, weight = item.partition(':')
+        values.append(convert(value))
+        weights.append(float(weight) if weight else 1.0)
+    if not values:
+        raise ValueError(f"Empty distribution: {text!r}")
+    total = sum(weights)
+    return values, [w / total for w in weights]
+
+
+def parse_resolution(text):
+    """Parse 'WIDTHxHEIGHT' into a (width, height) tuple."""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def parse_range(text):
+    """Parse 'LOW-HIGH' (or a single value) into an inclusive (low, high) tuple."""
+    low, _, high = text.partition('-')
+    return int(low), int(high or low)
+
+
+class CorpusSpec:
+    """Distributions the corpus is drawn from."""
+
+    def __init__(self, count, seed=0,
+                 resolutions='640x480:4,1280x720:3,1920x1080:2,300x300:1',
+                 formats='jpeg:8,png:2',
+                 jpeg_quality='70-95',
+                 orientations='1:90,6:4,8:3,3:3'):
+        self.count = count
+        self.seed = seed
+        self.resolutions = parse_weighted(resolutions, parse_resolution)
+        self.formats = parse_weighted(formats)
+        self.jpeg_quality = parse_range(jpeg_quality)
+        self.orientations = parse_weighted(orientations, int)
+
+        for fmt in self.formats[0]:
+            if fmt not in EXTENSIONS:
+                raise ValueError(f"Unsupported format {fmt!r}, expected one of {', '.join(EXTENSIONS)}")
+        if 'webp' in self.formats[0] and not features.check('webp'):
+            raise ValueError("This Pillow build has no WebP support")
+        for orientation in self.orientations[0]:
+            if not 1 <= orientation <= 8:
+                raise ValueError(f"EXIF orientation must be 1-8, got {orientation}")
+
+
+def choose(rng, distribution):
+    values, probabilities = distribution
+    return values[rng.choice(len(values), p=probabilities)]
+
+
+def render_pixels(rng, width, height):
+    """Render an HxWx3 uint8 image: a gradient with a few shapes and sensor-like noise."""
+    y = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None]
+    x = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :]
+
+    # Linear gradient at a random angle, as indices into a 256-color ramp
+    start, end = rng.integers(0, 256, (2, 3))
+    palette = np.linspace(start, end, 256).astype(np.uint8)
+    angle = rng.random() * 2 * np.pi
+    t = x * np.cos(angle) + y * np.sin(angle)
+    t -= t.min()
+    t *= 255.0 / max(float(t.max()), 1e-6)
+    pixels = palette[t.astype(np.uint8)]
+
+    # A few filled ellipses and rectangles, each drawn as one boolean mask
+    for _ in range(rng.integers(1, 6)):
+        color = rng.integers(0, 256, 3, dtype=np.uint8)
+        cx, cy = rng.random(2)
+        rx, ry = rng.uniform(0.05, 0.35, 2)
+        if rng.random() < 0.5:
+            mask = ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2 <= 1.0
+        else:
+            mask = (np.abs(x - cx) <= rx) & (np.abs(y - cy) <= ry)
+        pixels[mask] = color
+
+    # Luminance noise shared by the three channels, so JPEG/PNG can't compress it away
+    amplitude = int(rng.integers(0, 21))
+    if amplitude:
+        noise = rng.integers(-amplitude, amplitude + 1, (height, width), dtype=np.int16)
+        pixels = np.clip(pixels.astype(np.int16) + noise[..., None], 0, 255).astype(np.uint8)
+    return pixels
+
+
+def generate_image(spec, index):
+    """Generate image number index; returns (encoded bytes, metadata dict)."""
+    rng = np.random.default_rng([spec.seed, index])
+    width, height = choose(rng, spec.resolutions)
+    fmt = choose(rng, spec.formats)
+    orientation = choose(rng, spec.orientations)
+    quality = int(rng.integers(spec.jpeg_quality[0], spec.jpeg_quality[1] + 1)) if fmt == 'jpeg' else None
+
+    image = Image.fromarray(render_pixels(rng, width, height), 'RGB')
+    save_args = {}
+    if fmt == 'jpeg':
+        save_args['quality'] = quality
+    elif fmt == 'png':
+        # Decoding cost doesn't depend on the level, and level 1 encodes far faster
+        save_args['compress_level'] = 1
+    if orientation != 1 and fmt in ('jpeg', 'png', 'webp'):
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = orientation
+        save_args['exif'] = exif.tobytes()
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), **save_args)
+
+    metadata = {
+        'index': index,
+        'width': width,
+        'height': height,
+        'format': fmt,
+        'quality': quality,
+        'orientation': orientation if 'exif' in save_args else 1,
+    }
+    return buffer.getvalue(), metadata
+
+
+def iter_images(spec, start=0, stop=None):
+    """Stream (bytes, metadata) for images start..stop in memory, without writing files."""
+    stop = spec.count if stop is None else min(stop, spec.count)
+    for index in range(start, stop):
+        yield generate_image(spec, index)
+
+
+def image_path(index, fmt):
+    """Relative path of image index inside the corpus directory."""
+    return os.path.join(f"shard_{index // FILES_PER_SHARD:05d}", f"img_{index:08d}{EXTENSIONS[fmt]}")
+
+
+def write_range(args):
+    """Generate and write images start..stop (runs in a worker process)."""
+    spec, output_dir, start, stop = args
+    rows = []
+    for data, metadata in iter_images(spec, start, stop):
+        relative = image_path(metadata['index'], metadata['format'])
+        path = os.path.join(output_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        metadata['path'] = relative
+        metadata['bytes'] = len(data)
+        rows.append(metadata)
+    return rows
+
+
+def generate_corpus(spec, output_dir, processes=None, chunk_size=256):
+    """Write the corpus to output_dir in parallel, with a manifest.jsonl in index order."""
+    os.makedirs(output_dir, exist_ok=True)
+    chunks = [(spec, output_dir, start, min(start + chunk_size, spec.count))
+              for start in range(0, spec.count, chunk_size)]
+    written = 0
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool, \
+            open(os.path.join(output_dir, 'manifest.jsonl'), 'w', encoding='utf-8') as manifest:
+        for rows in pool.imap(write_range, chunks):
+            for row in rows:
+                manifest.write(json.dumps(row) + '\n')
+            written += len(rows)
+            if written % (chunk_size * 40) == 0 or written == spec.count:
+                rate = written / (time.perf_counter() - started)
+                print(f"Generated {written}/{spec.count} images ({rate:.0f} img/s)")
+    return written
+
+
+def main():
+    """Main function to generate a load-test corpus."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic image corpus for load testing")
+    parser.add_argument('count', type=int, help="number of images")
+    parser.add_argument('-o', '--output', default='load_corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--resolutions', default='640x480:4,1280x720:3,1920x1080:2,300x300:1',
+                        help="weighted WIDTHxHEIGHT list, e.g. '640x480:3,1920x1080:1'")
+    parser.add_argument('--formats', default='jpeg:8,png:2', help="weighted list of jpeg, png, bmp, webp")
+    parser.add_argument('--jpeg-quality', default='70-95', help="inclusive JPEG quality range")
+    parser.add_argument('--orientations', default='1:90,6:4,8:3,3:3', help="weighted EXIF orientation list (1-8)")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all CPUs)")
+    args = parser.parse_args()
+
+    try:
+        spec = CorpusSpec(args.count, args.seed, args.resolutions, args.formats,
+                          args.jpeg_quality, args.orientations)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print("Image Recognition App - Load Test Corpus Generator")
+    print("=" * 60)
+    written = generate_corpus(spec, args.output, args.processes)
+    print("=" * 60)
+    print(f"✓ Wrote {written} images and manifest.jsonl to '{args.output}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,12 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import torch
-import torchvision.transforms as transforms
-from torchvision.models import resnet18, ResNet18_Weights
 import os
 
+from inference import (
+    build_transform, load_model, load_class_names, load_tuning_config, run_model, CLASS_NAMES_FILE
+)
+
 class ImageRecognitionApp:
     def __init__(self, root):
         self.root = root
@@ -16,6 +18,7 @@ class ImageRecognitionApp:
         # Initialize the model
         self.model = None
         self.transform = None
+        self.config = {}
         self.class_names = []
         
         # Load the model and classes
@@ -28,20 +31,12 @@ class ImageRecognitionApp:
     def load_model(self):
         """Load the pre-trained ResNet18 model"""
         try:
-            # Load pre-trained ResNet18 model
-            self.model = resnet18(weights=ResNet18_Weights.IMAGENET1K_V1)
-            self.model.eval()  # Set to evaluation mode
+            # Load pre-trained ResNet18 model with this host's tuned settings
+            self.config = load_tuning_config()
+            self.model = load_model(self.config)
             
             # Define the image transformation
-            self.transform = transforms.Compose([
-                transforms.Resize(256),
-                transforms.CenterCrop(224),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406],
-                    std=[0.229, 0.224, 0.225]
-                )
-            ])
+            self.transform = build_transform()
             
             print("Model loaded successfully!")
             
@@ -51,17 +46,13 @@ class ImageRecognitionApp:
     def load_class_names(self):
         """Load ImageNet class names from file"""
         try:
-            if os.path.exists('imagenet_classes.txt'):
-                with open('imagenet_classes.txt', 'r', encoding='utf-8') as f:
-                    self.class_names = [line.strip() for line in f.readlines()]
+            if os.path.exists(CLASS_NAMES_FILE):
+                self.class_names = load_class_names()
                 print(f"Loaded {len(self.class_names)} class names")
             else:
                 messagebox.showwarning("Warning", "imagenet_classes.txt not found. Using default class names.")
                 # Fallback to a few common classes
-                self.class_names = [
-                    "golden retriever", "labrador retriever", "german shepherd",
-                    "cat", "bird", "car", "truck", "bicycle", "person"
-                ]
+                self.class_names = load_class_names()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load class names: {str(e)}")
     
@@ -272,8 +263,7 @@ class ImageRecognitionApp:
             input_batch = input_tensor.unsqueeze(0)  # Add batch dimension
             
             # Perform prediction
-            with torch.no_grad():
-                output = self.model(input_batch)
+            output = run_model(self.model, input_batch, self.config.get('backend', 'eager'))
             
             # Get the predicted class
             probabilities = torch.nn.functional.softmax(output[0], dim=0)
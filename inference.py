@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Headless inference helpers for the image recognition app.
+Model loading, preprocessing and prediction live here, free of tkinter, so the
+GUI, the worker server and the command-line tools share one code path.
+"""
+
+import io
+import json
+import os
+import warnings
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+from torchvision.models import resnet18, ResNet18_Weights
+from PIL import Image
+
+from metrics import BATCH_SIZE, DECODE_SECONDS, FORWARD_SECONDS, IMAGES, MODEL_BYTES, PREPROCESS_SECONDS, model_size_bytes
+
+# Data files live next to this module, so tools started from any directory find them
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLASS_NAMES_FILE = os.path.join(MODULE_DIR, 'imagenet_classes.txt')
+
+# Written by tune_hardware.py; picked up automatically by load_model and Classifier
+TUNING_CONFIG_FILE = os.environ.get('IMAGE_RECOGNITION_TUNING', os.path.join(MODULE_DIR, 'tuning_config.json'))
+
+DEFAULT_BATCH_SIZE = 8
+
+# Ways of running the model that the tuner can choose between
+BACKENDS = ('eager', 'channels_last', 'bfloat16')
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Fallback to a few common classes when imagenet_classes.txt is missing
+FALLBACK_CLASS_NAMES = [
+    "golden retriever", "labrador retriever", "german shepherd",
+    "cat", "bird", "car", "truck", "bicycle", "person"
+]
+
+
+def build_transform():
+    """Build the ImageNet preprocessing pipeline expected by ResNet18."""
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+    ])
+
+
+def build_tensor_transform():
+    """Build the same pipeline for already decoded CHW uint8 tensors.
+
+    Resizing and cropping happen in uint8, so the only float copy is of the
+    224x224 crop. Resampling differs slightly from PIL's, so scores can differ
+    from the file path in the last decimal places.
+    """
+    return transforms.Compose([
+        transforms.Resize(256, antialias=True),
+        transforms.CenterCrop(224),
+        transforms.ConvertImageDtype(torch.float32),
+        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+    ])
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over any bytes-like buffer, without copying it."""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        end = min(self.position + len(target), len(self.view))
+        count = end - self.position
+        target[:count] = self.view[self.position:end]
+        self.position = end
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def array_to_chw(array):
+    """Wrap an HWC (or HW) uint8 NumPy array or tensor as a CHW RGB tensor view.
+
+    No pixel data is copied: grayscale is broadcast to three channels and an
+    alpha channel is sliced off. The exception is a NumPy view with negative
+    strides, such as the BGR to RGB flip frame[..., ::-1], which torch can't
+    wrap and is copied once.
+    """
+    if isinstance(array, np.ndarray):
+        if any(stride < 0 for stride in array.strides):
+            array = np.ascontiguousarray(array)
+        if not array.flags.writeable:
+            # torch warns about read-only arrays; the pixels are never written to
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                array = torch.from_numpy(array)
+        else:
+            array = torch.from_numpy(array)
+    if not isinstance(array, torch.Tensor):
+        raise TypeError(f"Expected a NumPy array or tensor, got {type(array).__name__}")
+    if array.dtype != torch.uint8:
+        raise ValueError(f"Expected uint8 pixels, got {array.dtype}")
+    if array.ndim == 2:
+        array = array.unsqueeze(-1)
+    if array.ndim != 3 or array.shape[-1] not in (1, 3, 4):
+        raise ValueError(f"Expected an HxWx1, HxWx3 or HxWx4 image, got shape {tuple(array.shape)}")
+    chw = array.permute(2, 0, 1)
+    if chw.shape[0] == 1:
+        return chw.expand(3, -1, -1)
+    return chw[:3]
+
+
+def load_tuning_config(filename=TUNING_CONFIG_FILE):
+    """Load the tuned settings for this host, or an empty dict if there are none."""
+    if not filename or not os.path.exists(filename):
+        return {}
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable tuning config {filename}: {e}")
+        return {}
+
+
+def apply_thread_settings(config):
+    """Apply the tuned intra-op and inter-op thread counts to this process."""
+    if config.get('intra_op_threads'):
+        torch.set_num_threads(config['intra_op_threads'])
+    if config.get('inter_op_threads'):
+        try:
+            torch.set_num_interop_threads(config['inter_op_threads'])
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work
+            pass
+
+
+def prepare_model(model, backend='eager'):
+    """Adapt an evaluation-mode model to the given backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend == 'channels_last':
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def run_model(model, batch, backend='eager'):
+    """Run a preprocessed NCHW batch through the model and return float32 logits."""
+    with torch.no_grad():
+        if backend == 'channels_last':
+            return model(batch.contiguous(memory_format=torch.channels_last))
+        if backend == 'bfloat16':
+            with torch.autocast('cpu', dtype=torch.bfloat16):
+                return model(batch).float()
+        return model(batch)
+
+
+def load_model(config=None):
+    """Load the pre-trained ResNet18 model in evaluation mode.
+
+    Thread counts and backend come from the tuning config when one exists.
+    """
+    if config is None:
+        config = load_tuning_config()
+    apply_thread_settings(config)
+    model = resnet18(weights=ResNet18_Weights.IMAGENET1K_V1)
+    model.eval()
+    return prepare_model(model, config.get('backend', 'eager'))
+
+
+def load_class_names(filename=CLASS_NAMES_FILE):
+    """Load ImageNet class names from file, or the fallback list if it is missing."""
+    if not os.path.exists(filename):
+        return list(FALLBACK_CLASS_NAMES)
+    with open(filename, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f.readlines()]
+
+
+def check_top_k(top_k, num_classes):
+    """Raise ValueError unless 1 <= top_k <= num_classes."""
+    if not 1 <= top_k <= num_classes:
+        raise ValueError(f"top_k must be between 1 and {num_classes}, got {top_k}")
+
+
+def format_prediction(label, confidence):
+    """Format a label and confidence the way the GUI displays it."""
+    return f"{label} ({confidence * 100:.1f}%)"
+
+
+class Classifier:
+    """ResNet18 classifier bundling the model, preprocessing and class names."""
+
+    def __init__(self, model=None, class_names=None, config=None):
+        self.config = config if config is not None else load_tuning_config()
+        self.backend = self.config.get('backend', 'eager')
+        self.batch_size = self.config.get('batch_size', DEFAULT_BATCH_SIZE)
+        self.model = model if model is not None else load_model(self.config)
+        self.transform = build_transform()
+        self.tensor_transform = build_tensor_transform()
+        self.class_names = class_names if class_names is not None else load_class_names()
+        MODEL_BYTES.set(model_size_bytes(self.model))
+
+    def class_name(self, class_id):
+        """Return the class name for an id, or a placeholder if it is out of range."""
+        if class_id < len(self.class_names):
+            return self.class_names[class_id]
+        return f"Class {class_id}"
+
+    def load_image(self, file_path):
+        """Open and fully decode an image file as RGB."""
+        with DECODE_SECONDS.time():
+            with Image.open(file_path) as image:
+                return image.convert('RGB')
+
+    def load_image_bytes(self, data):
+        """Decode an encoded image held in bytes, a bytearray or a memoryview as RGB."""
+        source = io.BytesIO(data) if isinstance(data, bytes) else BufferReader(data)
+        with DECODE_SECONDS.time():
+            with Image.open(source) as image:
+                return image.convert('RGB')
+
+    def preprocess(self, image):
+        """Convert a PIL image into a normalized 3x224x224 tensor."""
+        with PREPROCESS_SECONDS.time():
+            return self.transform(image.convert('RGB'))
+
+    def preprocess_array(self, array):
+        """Convert a decoded HWC uint8 array or tensor into a normalized 3x224x224 tensor."""
+        with PREPROCESS_SECONDS.time():
+            return self.tensor_transform(array_to_chw(array))
+
+    def to_tensor(self, item):
+        """Preprocess one input: a file path, encoded bytes, a PIL image or a decoded array."""
+        if isinstance(item, (str, os.PathLike)):
+            return self.preprocess(self.load_image(item))
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            return self.preprocess(self.load_image_bytes(item))
+        if isinstance(item, Image.Image):
+            return self.preprocess(item)
+        return self.preprocess_array(item)
+
+    def predict_batch(self, batch, top_k=1):
+        """Run a preprocessed NCHW batch through the model.
+
+        Returns one list of (class name, confidence) pairs per image, sorted
+        by decreasing confidence.
+        """
+        with FORWARD_SECONDS.time():
+            output = run_model(self.model, batch, self.backend)
+        BATCH_SIZE.observe(len(batch))
+        IMAGES.inc(len(batch))
+        probabilities = torch.nn.functional.softmax(output, dim=1)
+        confidences, class_ids = torch.topk(probabilities, top_k, dim=1)
+        return [
+            [(self.class_name(class_id), confidence)
+             for class_id, confidence in zip(ids.tolist(), confs.tolist())]
+            for ids, confs in zip(class_ids, confidences)
+        ]
+
+    def classify(self, items, top_k=1):
+        """Classify a list of inputs (see to_tensor) in batches of at most batch_size."""
+        check_top_k(top_k, len(self.class_names))
+        results = []
+        for start in range(0, len(items), self.batch_size):
+            tensors = [self.to_tensor(item) for item in items[start:start + self.batch_size]]
+            results.extend(self.predict_batch(torch.stack(tensors), top_k))
+        return results
+
+    def classify_files(self, file_paths, top_k=1):
+        """Classify image files in forward passes of at most batch_size images."""
+        return self.classify(list(file_paths), top_k)
+
+    def classify_file(self, file_path, top_k=1):
+        """Classify a single image file."""
+        return self.classify([file_path], top_k)[0]
+
+    def classify_bytes(self, data, top_k=1):
+        """Classify an encoded image (JPEG, PNG, ...) already held in memory."""
+        return self.classify([data], top_k)[0]
+
+    def classify_array(self, array, top_k=1):
+        """Classify a decoded HWC uint8 NumPy array or tensor without copying it first."""
+        return self.classify([array], top_k)[0]
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+In-process metrics for the image recognition app.
+
+A small Prometheus-compatible registry: counters, gauges and histograms with
+optional labels, rendered in the text exposition format. Metrics can be served
+from an HTTP scrape endpoint or written periodically to a file for the
+node_exporter textfile collector. Each observation is a lock and a few
+arithmetic operations, so the instrumentation stays on in production.
+"""
+
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from 1 ms to 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def format_labels(labels):
+    """Render a label dict as {name="value",...}, or an empty string."""
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class for a metric family with optional label names."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        """Return the child metric for a set of label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        # Unlabelled metrics use a single child with no label values
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use .labels() first")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self, const_labels):
+        """Yield (suffix, labels, value) for every child."""
+        for key, child in list(self._children.items()):
+            labels = dict(const_labels)
+            labels.update(zip(self.labelnames, key))
+            for suffix, extra, value in child.samples():
+                yield suffix, dict(labels, **extra), value
+
+    def render(self, const_labels=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples(const_labels or {}):
+            lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return '\n'.join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield '', {}, self.value
+
+
+class Counter(Metric):
+    """Monotonically increasing count. The exported name gets a _total suffix."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name + '_total', documentation, labelnames)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Compute the value at scrape time instead of storing it."""
+        self.function = function
+
+    def samples(self):
+        yield '', {}, self.function() if self.function else self.value
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager that observes the elapsed seconds of its block."""
+        return _Timer(self)
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield '_bucket', {'le': format_value(bound)}, cumulative
+        yield '_sum', {}, total
+        yield '_count', {}, cumulative
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram(Metric):
+    """Distribution of observations over fixed buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics = []
+        self.const_labels = {}
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        if not metric.labelnames:
+            metric.labels()  # Export unlabelled metrics before their first update
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        return '\n'.join(metric.render(self.const_labels) for metric in self.metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'image_recognition_requests', "Classification requests received", ['source'])
+ERRORS = REGISTRY.counter(
+    'image_recognition_errors', "Classification requests that failed", ['source'])
+SCHEDULED = REGISTRY.counter(
+    'image_recognition_scheduled', "Inputs queued by the priority scheduler, by priority class", ['priority'])
+IMAGES = REGISTRY.counter(
+    'image_recognition_images', "Images run through the model")
+STAGE_SECONDS = REGISTRY.histogram(
+    'image_recognition_stage_seconds', "Time per pipeline stage: decode and preprocess per image, forward per batch", ['stage'])
+BATCH_SIZE = REGISTRY.histogram(
+    'image_recognition_batch_size', "Images per forward pass", buckets=BATCH_SIZE_BUCKETS)
+QUEUE_DEPTH = REGISTRY.gauge(
+    'image_recognition_queue_depth', "Images waiting to be classified")
+CACHE_LOOKUPS = REGISTRY.counter(
+    'image_recognition_cache_lookups', "Lookups of previously computed results", ['result'])
+MODEL_BYTES = REGISTRY.gauge(
+    'image_recognition_model_bytes', "Memory held by model parameters and buffers")
+RESIDENT_BYTES = REGISTRY.gauge(
+    'process_resident_memory_bytes', "Resident memory size of this process")
+
+# Pre-create the children used on hot paths so they always appear in scrapes
+DECODE_SECONDS = STAGE_SECONDS.labels(stage='decode')
+PREPROCESS_SECONDS = STAGE_SECONDS.labels(stage='preprocess')
+FORWARD_SECONDS = STAGE_SECONDS.labels(stage='forward')
+CACHE_HITS = CACHE_LOOKUPS.labels(result='hit')
+CACHE_MISSES = CACHE_LOOKUPS.labels(result='miss')
+
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted values."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def resident_memory_bytes():
+    """Current resident set size, or peak RSS where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+RESIDENT_BYTES.set_function(resident_memory_bytes)
+
+
+def model_size_bytes(model):
+    """Bytes held by a torch model's parameters and buffers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def write_textfile(path, registry=REGISTRY):
+    """Atomically write the current metrics to path."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def start_textfile_writer(path, interval=10.0, registry=REGISTRY):
+    """Rewrite the metrics file every interval seconds from a daemon thread."""
+    def loop():
+        while True:
+            try:
+                write_textfile(path, registry)
+            except OSError as e:
+                print(f"Could not write metrics to {path}: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='metrics-writer', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_http_server(port, host='127.0.0.1', registry=REGISTRY):
+    """Serve the metrics at http://host:port/metrics from a daemon thread.
+
+    Only reachable from this machine unless another host address is given.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
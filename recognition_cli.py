@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Command-line entry point for the image recognition app.
+
+Without arguments this opens the GUI. With image paths (or '-' for image bytes
+on stdin) it acts as a thin client: the images are forwarded to a warm local
+daemon over a Unix domain socket and the predictions are printed. The daemon
+is started automatically on first use and exits after an idle timeout, so
+repeated calls skip the torch import, weight loading and first slow forward.
+
+This module only uses the standard library, to keep client start-up fast.
+"""
+
+import argparse
+import base64
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+
+# Loading the model on a cold machine can take a while
+DAEMON_START_TIMEOUT = 120.0
+
+
+def runtime_dir():
+    """Private per-user directory for the daemon's socket, lock file and log.
+
+    Lives under $XDG_RUNTIME_DIR when set, otherwise in the temp directory. An
+    existing directory is only used if it belongs to this user and nobody else
+    can enter it: in a shared /tmp, another user could have created it first
+    to plant symlinks or take over the socket name.
+    """
+    uid = os.getuid() if hasattr(os, 'getuid') else None
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base and os.path.isdir(base):
+        path = os.path.join(base, 'image-recognition')
+    else:
+        path = os.path.join(tempfile.gettempdir(), f"image-recognition-{uid if uid is not None else 0}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if uid is not None and (not stat.S_ISDIR(info.st_mode) or info.st_uid != uid or info.st_mode & 0o077):
+        raise RuntimeError(f"{path} is not a private directory owned by this user (expected mode 0700)")
+    return path
+
+
+def default_socket_path():
+    """Per-user socket path for the daemon; its lock file and log sit next to it."""
+    return os.path.join(runtime_dir(), 'daemon.sock')
+
+
+def connect(socket_path):
+    """Connect to the daemon, or return None if it isn't running."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        return client
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+
+
+def start_daemon(socket_path, idle_timeout):
+    """Launch the daemon in the background and wait until it accepts connections.
+
+    A daemon that is still shutting down holds the lock for a moment, which
+    makes the new one exit straight away; it is launched again until the lock
+    is free.
+    """
+    log_path = socket_path + '.log'
+    daemon_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recognition_daemon.py')
+
+    def launch():
+        with open(log_path, 'ab') as log:
+            return subprocess.Popen(
+                [sys.executable, daemon_script, '--socket', socket_path, '--idle-timeout', str(idle_timeout)],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                start_new_session=True, close_fds=True,
+            )
+
+    process = launch()
+    deadline = time.monotonic() + DAEMON_START_TIMEOUT
+    while time.monotonic() < deadline:
+        client = connect(socket_path)
+        if client is not None:
+            return client
+        if process.poll() is not None:
+            if process.returncode != 0:
+                raise RuntimeError(f"Daemon failed to start, see {log_path}")
+            process = launch()
+        time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for the daemon, see {log_path}")
+
+
+def build_requests(inputs, top_k):
+    """Turn command-line inputs into daemon requests."""
+    requests = []
+    for item in inputs:
+        if item == '-':
+            data = sys.stdin.buffer.read()
+            requests.append({'data': base64.b64encode(data).decode('ascii'), 'top_k': top_k})
+        else:
+            # The daemon has its own working directory
+            requests.append({'path': os.path.abspath(item), 'top_k': top_k})
+    return requests
+
+
+def send_requests(client, requests):
+    """Pipeline all requests over one connection and return the responses received, in order.
+
+    Requests are written from a separate thread so replies can't fill the
+    socket buffers and stall a long request list. If the connection drops,
+    the responses received so far are returned and the rest are missing.
+    """
+    def write_requests():
+        try:
+            with client.makefile('wb') as writer:
+                for request in requests:
+                    writer.write(json.dumps(request).encode('utf-8') + b'\n')
+            client.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass  # The reader sees the connection drop
+
+    responses = []
+    with client, client.makefile('rb') as reader:
+        writer_thread = threading.Thread(target=write_requests, daemon=True)
+        writer_thread.start()
+        try:
+            for line in reader:
+                responses.append(json.loads(line))
+        except (ConnectionError, ValueError):
+            pass  # Reset, or a reply cut off mid-line
+        writer_thread.join()
+    return responses
+
+
+def classify_in_process(requests):
+    """Classify without the daemon, e.g. when Unix sockets aren't available."""
+    from inference import Classifier
+    from serve_workers import handle_request
+    classifier = Classifier()
+    return [handle_request(classifier, request) for request in requests]
+
+
+def print_results(inputs, responses, top_k):
+    """Print each input's predictions and return how many inputs failed, including unanswered ones."""
+    failed = 0
+    for index, item in enumerate(inputs):
+        name = 'stdin' if item == '-' else item
+        if index >= len(responses):
+            failed += 1
+            print(f"{name}: error: no response, the daemon closed the connection", file=sys.stderr)
+            continue
+        response = responses[index]
+        if 'error' in response:
+            failed += 1
+            print(f"{name}: error: {response['error']}", file=sys.stderr)
+        elif top_k == 1:
+            print(f"{name}: {response['prediction']}")
+        else:
+            print(f"{name}:")
+            for prediction in response['top_k']:
+                print(f"  {prediction['label']} ({prediction['confidence'] * 100:.1f}%)")
+    return failed
+
+
+def main(argv=None):
+    """Open the GUI, or classify the given images through the warm daemon."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        from image_recognition_app import main as gui_main
+        return gui_main()
+
+    parser = argparse.ArgumentParser(
+        prog='image-recognition',
+        description="Classify images. Run without arguments to open the GUI.")
+    parser.add_argument('images', nargs='*', help="image files, or '-' to read one image from stdin")
+    parser.add_argument('-k', '--top-k', type=int, default=1)
+    parser.add_argument('--socket', help="daemon socket path (default: in a private per-user directory)")
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="seconds an auto-started daemon stays up without requests")
+    parser.add_argument('--no-daemon', action='store_true', help="load the model in this process instead")
+    parser.add_argument('--stop-daemon', action='store_true', help="shut down a running daemon")
+    args = parser.parse_args(argv)
+
+    if args.socket is None and not args.no_daemon:
+        try:
+            args.socket = default_socket_path()
+        except (RuntimeError, OSError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+
+    if args.stop_daemon:
+        client = connect(args.socket)
+        if client is None:
+            print("Daemon is not running")
+        else:
+            send_requests(client, [{'command': 'shutdown'}])
+            print("Daemon stopped")
+        return 0
+    if not args.images:
+        parser.error("no images given")
+
+    requests = build_requests(args.images, args.top_k)
+    if args.no_daemon or not hasattr(socket, 'AF_UNIX'):
+        responses = classify_in_process(requests)
+    else:
+        try:
+            client = connect(args.socket) or start_daemon(args.socket, args.idle_timeout)
+            responses = send_requests(client, requests)
+            if not responses:
+                # Connected just as an idle daemon was exiting, so nothing was answered: start a new one and resend
+                responses = send_requests(start_daemon(args.socket, args.idle_timeout), requests)
+        except RuntimeError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+
+    failed = print_results(args.images, responses, args.top_k)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
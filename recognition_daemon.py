@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Warm classification daemon for the image-recognition command.
+
+Loads the model once, runs a warm-up forward pass and serves requests on a
+Unix domain socket using the same newline-delimited JSON protocol as
+serve_workers.py. Clients are served concurrently through the priority
+scheduler. The daemon exits after idle_timeout seconds without requests, and
+a lock file makes sure only one daemon owns the socket.
+
+Usually started automatically by recognition_cli.py.
+"""
+
+import argparse
+import fcntl
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from inference import Classifier
+from recognition_cli import DEFAULT_IDLE_TIMEOUT, default_socket_path
+from scheduler import DEFAULT_MAX_BULK_WAIT, DEFAULT_MAX_INTERACTIVE_DELAY, PriorityScheduler
+from serve_workers import completed, create_listener, decode_line, serve_pipelined, submit_request
+
+
+class Daemon:
+    """Serve a warm Classifier on a Unix socket until idle or shut down."""
+
+    def __init__(self, classifier, listener, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 max_interactive_delay=DEFAULT_MAX_INTERACTIVE_DELAY, max_bulk_wait=DEFAULT_MAX_BULK_WAIT):
+        self.classifier = classifier
+        self.listener = listener
+        self.idle_timeout = idle_timeout
+        self.scheduler = PriorityScheduler(classifier, max_interactive_delay, max_bulk_wait)
+        self.lock = threading.Lock()
+        self.active_connections = 0
+        self.last_activity = time.monotonic()
+        self.running = True
+
+    def touch(self):
+        with self.lock:
+            self.last_activity = time.monotonic()
+
+    def submit(self, line):
+        """Return a Future of the response to one request line, handling the daemon's own commands."""
+        self.touch()
+        request, error = decode_line(line)
+        if error is not None:
+            return completed(error)
+        if request.get('command') == 'shutdown':
+            self.running = False
+            return completed({'status': 'shutting down'})
+        if request.get('command') == 'ping':
+            return completed({'status': 'ok', 'pid': os.getpid()})
+        return submit_request(self.classifier, request, self.scheduler)
+
+    def handle_connection(self, conn):
+        """Serve one client's requests, all of them in flight at once so they share batches."""
+        with self.lock:
+            self.active_connections += 1
+        try:
+            with conn, conn.makefile('rb') as reader, conn.makefile('wb') as writer:
+                serve_pipelined(reader, writer, self.submit)
+        except (ConnectionError, BrokenPipeError):
+            pass
+        finally:
+            with self.lock:
+                self.active_connections -= 1
+                self.last_activity = time.monotonic()
+
+    def idle(self):
+        with self.lock:
+            return self.active_connections == 0 and time.monotonic() - self.last_activity > self.idle_timeout
+
+    def serve(self):
+        """Accept connections until shut down or idle for too long."""
+        self.listener.settimeout(1.0)
+        while self.running and not self.idle():
+            try:
+                conn, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            self.touch()
+            threading.Thread(target=self.handle_connection, args=(conn,), daemon=True).start()
+        self.scheduler.close()
+
+
+def acquire_lock(lock_path):
+    """Take an exclusive lock for the daemon's lifetime, or return None if another daemon holds it."""
+    lock_file = open(lock_path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+def main():
+    """Run the warm classification daemon."""
+    parser = argparse.ArgumentParser(description="Keep a warm image recognition model behind a Unix socket")
+    parser.add_argument('--socket', help="socket path (default: in a private per-user directory)")
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="exit after this many seconds without requests")
+    parser.add_argument('--max-interactive-delay', type=float, default=DEFAULT_MAX_INTERACTIVE_DELAY,
+                        help="seconds a bulk batch may hold up a newly arrived interactive request")
+    parser.add_argument('--max-bulk-wait', type=float, default=DEFAULT_MAX_BULK_WAIT,
+                        help="seconds after which queued bulk requests get reserved batch slots")
+    args = parser.parse_args()
+
+    if args.socket is None:
+        try:
+            args.socket = default_socket_path()
+        except (RuntimeError, OSError) as e:
+            print(f"✗ {e}")
+            return 1
+
+    lock_file = acquire_lock(args.socket + '.lock')
+    if lock_file is None:
+        print("Another daemon is already running")
+        return 0
+
+    classifier = Classifier()
+    # Pay for the first, slow forward pass now rather than on the first request
+    classifier.classify_array(np.zeros((256, 256, 3), dtype=np.uint8))
+    print(f"Model loaded and warmed up, pid {os.getpid()}", flush=True)
+
+    old_umask = os.umask(0o177)  # Socket only usable by this user
+    try:
+        listener = create_listener(socket_path=args.socket)
+    finally:
+        os.umask(old_umask)
+    print(f"Listening on {args.socket} (idle timeout {args.idle_timeout:.0f}s)", flush=True)
+
+    try:
+        Daemon(classifier, listener, args.idle_timeout, args.max_interactive_delay, args.max_bulk_wait).serve()
+    finally:
+        listener.close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        lock_file.close()
+    print("Daemon stopped", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
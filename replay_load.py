@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Replay recorded workloads against the image recognition prediction path.
+
+A workload is a JSONL file with one request per line:
+
+    {"image": "photos/cat.jpg", "timestamp": 12.25, "options": {"top_k": 3, "priority": "bulk"}}
+
+"image" is a path (relative paths are resolved against the workload file's
+directory), "timestamp" is the arrival time in seconds (only differences
+matter) and "options" is merged into the request sent to the model.
+
+Two modes are supported:
+
+- open loop: requests are sent at their recorded arrival times, optionally
+  scaled with --speed. Latency is measured from when each request was *due*,
+  not from when it was actually sent, so time spent queued behind slow
+  responses is counted (no coordinated omission).
+- closed loop: a fixed number of clients send requests back to back,
+  ignoring timestamps. This measures capacity; its latencies are service
+  times and don't reflect queueing under a given arrival rate.
+
+Requests go either to an in-process model (the default) or to a running
+serve_workers.py / recognition_daemon.py over TCP or a Unix socket.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import percentile
+
+REPORTED_PERCENTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def load_workload(path):
+    """Read a workload file into request dicts sorted by arrival, with times relative to the first."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                image = record['image']
+                timestamp = float(record.get('timestamp', 0.0))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{line_number}: invalid workload entry: {e}") from None
+            request = dict(record.get('options', {}))
+            request['path'] = os.path.join(base_dir, image)
+            entries.append((timestamp, request))
+    entries.sort(key=lambda entry: entry[0])
+    if entries:
+        start = entries[0][0]
+        entries = [(timestamp - start, request) for timestamp, request in entries]
+    return entries
+
+
+def synthesize_workload(image_paths, rate, duration, seed=0, options=None):
+    """Build Poisson arrivals at rate requests/second over duration seconds, cycling through images."""
+    rng = random.Random(seed)
+    records = []
+    timestamp = rng.expovariate(rate)
+    index = 0
+    while timestamp < duration:
+        record = {'image': image_paths[index % len(image_paths)], 'timestamp': round(timestamp, 6)}
+        if options:
+            record['options'] = options
+        records.append(record)
+        index += 1
+        timestamp += rng.expovariate(rate)
+    return records
+
+
+class LocalTarget:
+    """Send requests to a model loaded in this process, through the priority scheduler."""
+
+    def __init__(self):
+        from inference import Classifier
+        from scheduler import PriorityScheduler
+        from serve_workers import handle_request
+        self.classifier = Classifier()
+        self.scheduler = PriorityScheduler(self.classifier)
+        self.handle_request = handle_request
+
+    def send(self, request):
+        return self.handle_request(self.classifier, request, self.scheduler)
+
+    def close(self):
+        self.scheduler.close()
+
+
+class SocketTarget:
+    """Send requests to a running server over the newline-delimited JSON protocol.
+
+    Each sending thread keeps its own connection.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.address.startswith('unix:'):
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(self.address[len('unix:'):])
+        else:
+            host, _, port = self.address.rpartition(':')
+            conn = socket.create_connection((host or '127.0.0.1', int(port)))
+        with self.lock:
+            self.connections.append(conn)
+        return conn, conn.makefile('rb'), conn.makefile('wb')
+
+    def send(self, request):
+        if not hasattr(self.local, 'stream'):
+            self.local.stream = self.connect()
+        _, reader, writer = self.local.stream
+        writer.write(json.dumps(request).encode('utf-8') + b'\n')
+        writer.flush()
+        line = reader.readline()
+        if not line:
+            del self.local.stream
+            raise ConnectionError("Server closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+
+
+class Recorder:
+    """Thread-safe collection of per-request outcomes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+        self.first_due = None
+        self.last_done = None
+
+    def record(self, due, done, ok):
+        with self.lock:
+            self.latencies.append(done - due)
+            if not ok:
+                self.errors += 1
+            self.first_due = due if self.first_due is None else min(self.first_due, due)
+            self.last_done = done if self.last_done is None else max(self.last_done, done)
+
+
+def timed_send(target, request, due, recorder):
+    """Send one request and record its latency measured from its due time."""
+    try:
+        response = target.send(request)
+        ok = 'error' not in response
+    except Exception:
+        ok = False
+    recorder.record(due, time.perf_counter(), ok)
+
+
+def run_open_loop(target, entries, speed=1.0, max_in_flight=64):
+    """Send each request at its (scaled) arrival time."""
+    recorder = Recorder()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        start = time.perf_counter()
+        for timestamp, request in entries:
+            due = start + timestamp / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(timed_send, target, request, due, recorder)
+    return recorder
+
+
+def run_closed_loop(target, entries, concurrency=4):
+    """Send requests back to back from a fixed number of clients."""
+    recorder = Recorder()
+    requests = iter([request for _, request in entries])
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                request = next(requests, None)
+            if request is None:
+                return
+            timed_send(target, request, time.perf_counter(), recorder)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+
+def summarize(recorder, entries, mode, speed=1.0):
+    """Build the report dict: throughput, latency percentiles and error rate."""
+    total = len(recorder.latencies)
+    elapsed = (recorder.last_done - recorder.first_due) if total else 0.0
+    report = {
+        'mode': mode,
+        'requests': total,
+        'errors': recorder.errors,
+        'error_rate': recorder.errors / total if total else 0.0,
+        'elapsed_seconds': elapsed,
+        'throughput': total / elapsed if elapsed > 0 else 0.0,
+    }
+    if mode == 'open' and len(entries) > 1 and entries[-1][0] > 0:
+        report['offered_rate'] = (len(entries) - 1) / (entries[-1][0] / speed)
+    if total:
+        report['latency_ms'] = {
+            f"p{fraction * 100:g}": percentile(recorder.latencies, fraction) * 1000
+            for fraction in REPORTED_PERCENTILES
+        }
+        report['latency_ms']['max'] = max(recorder.latencies) * 1000
+        report['latency_ms']['mean'] = sum(recorder.latencies) / total * 1000
+    return report
+
+
+def print_report(report):
+    print("=" * 60)
+    print(f"Mode:        {report['mode']} loop")
+    print(f"Requests:    {report['requests']} ({report['errors']} errors, {report['error_rate'] * 100:.2f}%)")
+    if 'offered_rate' in report:
+        print(f"Offered:     {report['offered_rate']:.1f} req/s")
+    print(f"Throughput:  {report['throughput']:.1f} req/s over {report['elapsed_seconds']:.1f}s")
+    if 'latency_ms' in report:
+        print("Latency:     " + ", ".join(f"{name} {value:.1f} ms" for name, value in report['latency_ms'].items()))
+
+
+def main():
+    """Replay a workload file, or synthesize one."""
+    parser = argparse.ArgumentParser(description="Replay JSONL request logs against the image recognition model")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay = subparsers.add_parser('replay', help="replay a workload file")
+    replay.add_argument('workload', help="JSONL workload file")
+    replay.add_argument('--mode', choices=['open', 'closed'], default='open')
+    replay.add_argument('--speed', type=float, default=1.0, help="open loop: arrival-rate multiplier")
+    replay.add_argument('--max-in-flight', type=int, default=64, help="open loop: concurrent requests allowed")
+    replay.add_argument('--concurrency', type=int, default=4, help="closed loop: number of clients")
+    replay.add_argument('--target', default='local',
+                        help="'local' for an in-process model, 'HOST:PORT' or 'unix:PATH' for a running server")
+    replay.add_argument('--report', help="also write the report as JSON to this file")
+
+    synth = subparsers.add_parser('synthesize', help="write a workload with Poisson arrivals over a directory of images")
+    synth.add_argument('directory')
+    synth.add_argument('-o', '--output', required=True)
+    synth.add_argument('--rate', type=float, default=10.0, help="mean requests per second")
+    synth.add_argument('--duration', type=float, default=60.0, help="seconds of traffic")
+    synth.add_argument('--seed', type=int, default=0)
+    synth.add_argument('--top-k', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'synthesize':
+        from bulk_classify import iter_image_files
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        images = sorted(os.path.relpath(path, output_dir) for path in iter_image_files(args.directory))
+        if not images:
+            parser.error(f"no images found in {args.directory}")
+        records = synthesize_workload(images, args.rate, args.duration, args.seed, {'top_k': args.top_k})
+        os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        print(f"✓ Wrote {len(records)} requests over {args.duration:.0f}s to {args.output}")
+        return 0
+
+    entries = load_workload(args.workload)
+    if not entries:
+        print(f"✗ {args.workload} contains no requests")
+        return 1
+
+    target = LocalTarget() if args.target == 'local' else SocketTarget(args.target)
+    print(f"Replaying {len(entries)} requests ({args.mode} loop) against {args.target}")
+    try:
+        if args.mode == 'open':
+            recorder = run_open_loop(target, entries, args.speed, args.max_in_flight)
+        else:
+            recorder = run_closed_loop(target, entries, args.concurrency)
+    finally:
+        target.close()
+
+    report = summarize(recorder, entries, args.mode, args.speed)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
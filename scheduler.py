@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Priority scheduler for sharing one model between interactive and bulk work.
+
+Inputs are submitted with a priority class and return a Future. A single
+thread forms batches: queued interactive items always go into the next batch
+ahead of bulk items, and bulk-only batches are kept small enough that an
+interactive item arriving mid-batch waits no longer than max_interactive_delay.
+Bulk items that have waited longer than max_bulk_wait get reserved slots so
+a steady stream of interactive requests can't starve them.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import torch
+
+import metrics
+from inference import check_top_k
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, BULK)
+
+# Weight of the newest measurement in the per-image cost estimate
+COST_SMOOTHING = 0.2
+
+DEFAULT_MAX_INTERACTIVE_DELAY = 0.25
+DEFAULT_MAX_BULK_WAIT = 5.0
+
+
+class _Job:
+    __slots__ = ('item', 'top_k', 'future', 'enqueued')
+
+    def __init__(self, item, top_k):
+        self.item = item
+        self.top_k = top_k
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class PriorityScheduler:
+    """Batch classification requests from two priority classes onto one Classifier."""
+
+    def __init__(self, classifier, max_interactive_delay=DEFAULT_MAX_INTERACTIVE_DELAY,
+                 max_bulk_wait=DEFAULT_MAX_BULK_WAIT, start=True):
+        self.classifier = classifier
+        self.max_interactive_delay = max_interactive_delay
+        self.max_bulk_wait = max_bulk_wait
+        self.queues = {INTERACTIVE: deque(), BULK: deque()}
+        self.condition = threading.Condition()
+        self.seconds_per_image = None
+        self.running = True
+        self.thread = None
+        if start:
+            self.thread = threading.Thread(target=self._run, name='priority-scheduler', daemon=True)
+            self.thread.start()
+
+    def submit(self, item, priority=INTERACTIVE, top_k=1):
+        """Queue one input (anything Classifier.to_tensor accepts) and return a Future.
+
+        Invalid arguments raise here rather than failing the batch the input would join.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {', '.join(PRIORITIES)}")
+        check_top_k(top_k, len(self.classifier.class_names))
+        job = _Job(item, top_k)
+        with self.condition:
+            if not self.running:
+                raise RuntimeError("Scheduler is closed")
+            self.queues[priority].append(job)
+            self._update_queue_depth()
+            self.condition.notify()
+        metrics.SCHEDULED.labels(priority=priority).inc()
+        return job.future
+
+    def map(self, items, priority=BULK, top_k=1):
+        """Queue many inputs and return their Futures in order."""
+        return [self.submit(item, priority, top_k) for item in items]
+
+    def bulk_batch_limit(self):
+        """Largest bulk batch expected to finish within max_interactive_delay."""
+        if self.seconds_per_image is None:
+            return 1  # Measure with single images before growing bulk batches
+        fits = int(self.max_interactive_delay / max(self.seconds_per_image, 1e-6))
+        return max(1, min(self.classifier.batch_size, fits))
+
+    def next_batch(self, now=None):
+        """Take the jobs for the next forward pass off the queues (caller holds the lock)."""
+        now = time.monotonic() if now is None else now
+        interactive, bulk = self.queues[INTERACTIVE], self.queues[BULK]
+        batch_size = self.classifier.batch_size
+
+        if not interactive:
+            jobs = [bulk.popleft() for _ in range(min(len(bulk), self.bulk_batch_limit()))]
+        else:
+            # Starved bulk items only need reserved slots while interactive work is competing
+            reserved = 0
+            if bulk and now - bulk[0].enqueued > self.max_bulk_wait:
+                reserved = min(len(bulk), max(1, batch_size // 4))
+            jobs = [interactive.popleft() for _ in range(min(len(interactive), batch_size - reserved))]
+            jobs += [bulk.popleft() for _ in range(reserved)]
+        self._update_queue_depth()
+        return jobs
+
+    def run_batch(self, jobs):
+        """Preprocess and classify a batch, resolving each job's Future."""
+        started = time.perf_counter()
+        ready, tensors = [], []
+        for job in jobs:
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                tensors.append(self.classifier.to_tensor(job.item))
+                ready.append(job)
+            except Exception as e:
+                job.future.set_exception(e)
+        if not ready:
+            return
+
+        try:
+            top_k = max(job.top_k for job in ready)
+            predictions = self.classifier.predict_batch(torch.stack(tensors), top_k)
+        except Exception as e:
+            for job in ready:
+                job.future.set_exception(e)
+            return
+        for job, top in zip(ready, predictions):
+            job.future.set_result(top[:job.top_k])
+
+        cost = (time.perf_counter() - started) / len(ready)
+        if self.seconds_per_image is None:
+            self.seconds_per_image = cost
+        else:
+            self.seconds_per_image += COST_SMOOTHING * (cost - self.seconds_per_image)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not any(self.queues.values()):
+                    self.condition.wait()
+                if not self.running:
+                    return
+                jobs = self.next_batch()
+            self.run_batch(jobs)
+
+    def _update_queue_depth(self):
+        metrics.QUEUE_DEPTH.set(sum(len(queue) for queue in self.queues.values()))
+
+    def close(self):
+        """Stop the scheduler thread and cancel anything still queued."""
+        with self.condition:
+            self.running = False
+            for queue in self.queues.values():
+                while queue:
+                    queue.popleft().future.cancel()
+            self._update_queue_depth()
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Pre-forked multi-worker server for the image recognition model.
+
+The supervisor loads ResNet18 once and forks worker processes that share the
+weights copy-on-write. Each worker sizes its own torch thread pool and can be
+pinned to a disjoint set of CPUs, so workers don't oversubscribe cores.
+Workers that crash are restarted by the supervisor.
+
+Clients connect over TCP or a Unix domain socket and send one JSON object per
+line, for example {"path": "sample_images/red_square.jpg", "top_k": 3}, or
+{"data": "<base64 encoded image>"} for images that aren't on disk.
+Every request gets exactly one JSON line back, in request order; a client
+may send many lines without waiting, and they are batched together. Each
+worker serves clients concurrently and batches their requests through a priority scheduler, so
+requests marked "priority": "bulk" never hold up interactive ones.
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+import torch
+
+import metrics
+from inference import Classifier, format_prediction
+from scheduler import DEFAULT_MAX_BULK_WAIT, DEFAULT_MAX_INTERACTIVE_DELAY, INTERACTIVE, PriorityScheduler
+
+# A worker that dies sooner than this after starting is considered crash-looping
+MIN_WORKER_UPTIME = 1.0
+
+# Requests one connection may have queued before the server stops reading more
+MAX_IN_FLIGHT = 256
+
+
+def available_cpus():
+    """Return the sorted list of CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cpus(cpus, workers):
+    """Split CPUs into one contiguous, disjoint group per worker.
+
+    With fewer CPUs than workers, CPUs are shared round-robin instead.
+    """
+    cpus = list(cpus)
+    if workers <= 0:
+        return []
+    if len(cpus) < workers:
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    size, extra = divmod(len(cpus), workers)
+    groups = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(cpus[start:end])
+        start = end
+    return groups
+
+
+def configure_worker_threads(num_threads, cpus=None):
+    """Limit torch threading and optionally pin the calling process to CPUs."""
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already fixed for this process; the intra-op setting is what matters
+        pass
+
+
+def parse_request(request):
+    """Return the (input, top_k) to classify for a request dict."""
+    top_k = int(request.get('top_k', 1))
+    if 'data' in request:
+        return base64.b64decode(request['data']), top_k
+    if request.get('path'):
+        return request['path'], top_k
+    raise ValueError("Request needs a 'path' or 'data' field")
+
+
+def prediction_response(request, predictions):
+    label, confidence = predictions[0]
+    return {
+        'path': request.get('path'),
+        'prediction': format_prediction(label, confidence),
+        'top_k': [{'label': name, 'confidence': conf} for name, conf in predictions],
+    }
+
+
+def error_response(request, error):
+    metrics.ERRORS.labels(source='server').inc()
+    return {'path': request.get('path'), 'error': str(error)}
+
+
+def completed(response):
+    """Wrap a response dict that is already known in a finished Future."""
+    future = Future()
+    future.set_result(response)
+    return future
+
+
+def submit_request(classifier, request, scheduler):
+    """Queue a request dict on the scheduler and return a Future of its response dict.
+
+    The request is queued at its "priority" (interactive by default) and
+    batched with other requests, including later ones on the same connection.
+    """
+    metrics.REQUESTS.labels(source='server').inc()
+    try:
+        item, top_k = parse_request(request)
+        predictions = scheduler.submit(item, request.get('priority', INTERACTIVE), top_k)
+    except Exception as e:
+        return completed(error_response(request, e))
+
+    response = Future()
+
+    def resolve(future):
+        try:
+            response.set_result(prediction_response(request, future.result()))
+        except Exception as e:
+            response.set_result(error_response(request, e))
+
+    predictions.add_done_callback(resolve)
+    return response
+
+
+def handle_request(classifier, request, scheduler=None):
+    """Classify the image in a request dict (by path or base64 data) and return the response dict.
+
+    With a scheduler, the request is batched with other clients' requests.
+    """
+    if scheduler is not None:
+        return submit_request(classifier, request, scheduler).result()
+    metrics.REQUESTS.labels(source='server').inc()
+    try:
+        item, top_k = parse_request(request)
+        return prediction_response(request, classifier.classify([item], top_k)[0])
+    except Exception as e:
+        return error_response(request, e)
+
+
+def decode_line(line):
+    """Parse one request line, or return the error response for a malformed one."""
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, {'error': f"Invalid request: {e}"}
+
+
+def serve_pipelined(reader, writer, submit, max_in_flight=MAX_IN_FLIGHT):
+    """Read request lines and write their responses back in request order.
+
+    submit(line) returns a Future of the response dict. Every request read is
+    submitted straight away, so a client that sends many lines has them
+    batched together instead of classified one at a time; at most
+    max_in_flight responses are outstanding before reading pauses.
+    """
+    pending = queue.Queue(max_in_flight)
+
+    def write_responses():
+        connected = True
+        while True:
+            future = pending.get()
+            if future is None:
+                return
+            response = future.result()
+            if not connected:
+                continue  # Keep draining so the reader never blocks on a dead client
+            try:
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                writer.flush()
+            except OSError:
+                connected = False
+
+    thread = threading.Thread(target=write_responses, name='response-writer', daemon=True)
+    thread.start()
+    try:
+        for line in reader:
+            line = line.strip()
+            if line:
+                pending.put(submit(line))
+    finally:
+        pending.put(None)
+        thread.join()
+
+
+def handle_connection(classifier, conn, scheduler=None):
+    """Serve newline-delimited JSON requests until the client disconnects."""
+    def submit(line):
+        request, error = decode_line(line)
+        if error is not None:
+            return completed(error)
+        if scheduler is None:
+            return completed(handle_request(classifier, request))
+        return submit_request(classifier, request, scheduler)
+
+    with conn, conn.makefile('rb') as reader, conn.makefile('wb') as writer:
+        serve_pipelined(reader, writer, submit)
+
+
+def worker_main(classifier, listener, num_threads, cpus, slot=0, metrics_dir=None,
+                max_interactive_delay=DEFAULT_MAX_INTERACTIVE_DELAY, max_bulk_wait=DEFAULT_MAX_BULK_WAIT):
+    """Entry point of a forked worker: accept and serve connections forever."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_worker_threads(num_threads, cpus)
+    if metrics_dir:
+        # One file per worker, told apart by a worker label, for the textfile collector
+        metrics.REGISTRY.const_labels['worker'] = str(slot)
+        metrics.start_textfile_writer(os.path.join(metrics_dir, f"image_recognition_worker_{slot}.prom"))
+    scheduler = PriorityScheduler(classifier, max_interactive_delay, max_bulk_wait)
+    print(f"Worker {os.getpid()} ready ({num_threads} threads, cpus={cpus or 'any'})")
+
+    def serve(conn):
+        try:
+            handle_connection(classifier, conn, scheduler)
+        except (ConnectionError, BrokenPipeError) as e:
+            print(f"Worker {os.getpid()}: client connection lost: {e}")
+
+    while True:
+        conn, _ = listener.accept()
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+
+def create_listener(host='127.0.0.1', port=8765, socket_path=None, backlog=128):
+    """Create the listening socket shared by all workers."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((host, port))
+    listener.listen(backlog)
+    return listener
+
+
+class Supervisor:
+    """Fork workers over a shared listener and keep them running."""
+
+    def __init__(self, classifier, listener, workers, threads_per_worker, pin=False, metrics_dir=None,
+                 max_interactive_delay=DEFAULT_MAX_INTERACTIVE_DELAY, max_bulk_wait=DEFAULT_MAX_BULK_WAIT):
+        self.classifier = classifier
+        self.metrics_dir = metrics_dir
+        self.max_interactive_delay = max_interactive_delay
+        self.max_bulk_wait = max_bulk_wait
+        self.listener = listener
+        self.threads_per_worker = threads_per_worker
+        self.cpu_groups = partition_cpus(available_cpus(), workers) if pin else [None] * workers
+        self.context = multiprocessing.get_context('fork')
+        self.workers = {}
+        self.started_at = {}
+        self.running = False
+
+    def worker_threads(self, slot):
+        """Torch threads for a slot: the configured count, or else one per CPU it may use."""
+        if self.threads_per_worker:
+            return self.threads_per_worker
+        cpus = self.cpu_groups[slot]
+        if cpus:
+            # Pinned groups differ in size when the CPUs don't divide evenly
+            return len(cpus)
+        return max(1, len(available_cpus()) // len(self.cpu_groups))
+
+    def start_worker(self, slot):
+        """Fork the worker for a slot; it inherits the already loaded model."""
+        process = self.context.Process(
+            target=worker_main,
+            args=(self.classifier, self.listener, self.worker_threads(slot), self.cpu_groups[slot],
+                  slot, self.metrics_dir, self.max_interactive_delay, self.max_bulk_wait),
+            name=f"worker-{slot}",
+            daemon=True,
+        )
+        process.start()
+        self.workers[slot] = process
+        self.started_at[slot] = time.monotonic()
+
+    def run(self):
+        """Start all workers and restart any that exit until stopped."""
+        self.running = True
+        for slot in range(len(self.cpu_groups)):
+            self.start_worker(slot)
+
+        while self.running:
+            sentinels = {process.sentinel: slot for slot, process in self.workers.items()}
+            for sentinel in wait(list(sentinels), timeout=1.0):
+                slot = sentinels[sentinel]
+                process = self.workers[slot]
+                process.join()
+                if not self.running:
+                    break
+                print(f"Worker {slot} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+                if time.monotonic() - self.started_at[slot] < MIN_WORKER_UPTIME:
+                    time.sleep(MIN_WORKER_UPTIME)
+                self.start_worker(slot)
+
+        self.stop()
+
+    def stop(self, timeout=5.0):
+        """Terminate all workers, killing any that don't exit in time."""
+        self.running = False
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.workers.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+
+def main():
+    """Load the model once and serve it from pre-forked workers."""
+    cpu_count = len(available_cpus())
+    parser = argparse.ArgumentParser(description="Serve the image recognition model from pre-forked workers")
+    parser.add_argument('--workers', type=int, default=max(1, cpu_count // 2), help="number of worker processes")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="torch threads per worker (default: cpus / workers, or the size of each worker's CPU group with --pin)")
+    parser.add_argument('--pin', action='store_true', help="pin each worker to its own set of CPUs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', dest='socket_path', help="listen on a Unix domain socket instead of TCP")
+    parser.add_argument('--metrics-dir', help="directory for per-worker Prometheus metrics files")
+    parser.add_argument('--max-interactive-delay', type=float, default=DEFAULT_MAX_INTERACTIVE_DELAY,
+                        help="seconds a bulk batch may hold up a newly arrived interactive request")
+    parser.add_argument('--max-bulk-wait', type=float, default=DEFAULT_MAX_BULK_WAIT,
+                        help="seconds after which queued bulk requests get reserved batch slots")
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        print("Pre-forked serving requires a platform with fork()")
+        return 1
+
+    # Load once in the supervisor; it never runs inference itself, so the
+    # torch thread pools are first created inside the forked workers.
+    classifier = Classifier()
+    print("Model loaded successfully!")
+
+    listener = create_listener(args.host, args.port, args.socket_path)
+    address = args.socket_path or f"{args.host}:{args.port}"
+    print(f"Serving on {address} with {args.workers} workers")
+
+    if args.metrics_dir:
+        os.makedirs(args.metrics_dir, exist_ok=True)
+    supervisor = Supervisor(classifier, listener, args.workers, args.threads, pin=args.pin, metrics_dir=args.metrics_dir,
+                            max_interactive_delay=args.max_interactive_delay, max_bulk_wait=args.max_bulk_wait)
+
+    def shutdown(signum, frame):
+        supervisor.running = False
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    try:
+        supervisor.run()
+    finally:
+        listener.close()
+        if args.socket_path and os.path.exists(args.socket_path):
+            os.unlink(args.socket_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,20 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/yourusername/image-recognition-app",
     packages=find_packages(),
+    py_modules=[
+        "image_recognition_app",
+        "inference",
+        "metrics",
+        "scheduler",
+        "serve_workers",
+        "recognition_cli",
+        "recognition_daemon",
+        "bulk_classify",
+        "watch_folders",
+        "tune_hardware",
+        "generate_load_corpus",
+        "replay_load",
+    ],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Education",
@@ -36,7 +50,7 @@ setup(
     install_requires=requirements,
     entry_points={
         "console_scripts": [
-            "image-recognition=image_recognition_app:main",
+            "image-recognition=recognition_cli:main",
         ],
     },
     include_package_data=True,
@@ -98,6 +98,385 @@ def test_gui_creation():
         print(f"✗ Failed to create GUI: {e}")
         return False
 
+def test_worker_cpu_partition():
+    """Test that worker CPU groups are disjoint and cover every CPU."""
+    print("\nTesting worker CPU partitioning...")
+    
+    try:
+        from serve_workers import Supervisor, partition_cpus
+        groups = partition_cpus(range(10), 4)
+        flat = [cpu for group in groups for cpu in group]
+        
+        # Pinned workers default to one thread per CPU in their own group
+        supervisor = Supervisor(None, None, 4, None, pin=True)
+        supervisor.cpu_groups = groups
+        threads = [supervisor.worker_threads(slot) for slot in range(4)]
+        
+        if len(groups) == 4 and sorted(flat) == list(range(10)) and len(set(flat)) == 10 and threads == [3, 3, 2, 2]:
+            print(f"✓ CPUs partitioned across workers: {groups}")
+            return True
+        else:
+            print(f"✗ Unexpected CPU partition: {groups}, threads {threads}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to partition CPUs: {e}")
+        return False
+
+def test_tuning_selection():
+    """Test that the auto-tuner picks the fastest configuration within the latency bound."""
+    print("\nTesting tuning selection...")
+    
+    try:
+        import torch
+        from tune_hardware import check_backend_accuracy, select_best
+        results = [
+            {'batch_size': 1, 'throughput': 20.0, 'latency_ms': 50.0},
+            {'batch_size': 8, 'throughput': 60.0, 'latency_ms': 90.0},
+            {'batch_size': 32, 'throughput': 80.0, 'latency_ms': 400.0},
+        ]
+        best = select_best(results, latency_bound_ms=100.0)
+        fallback = select_best(results, latency_bound_ms=10.0)
+        
+        # Reduced precision must not pass a zero tolerance, a layout change must
+        model = torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3), torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten()).eval()
+        batch = torch.randn(4, 3, 16, 16)
+        strict = check_backend_accuracy(model, batch, 'bfloat16', max_logit_diff=0.0, min_top1_agreement=1.0)
+        layout = check_backend_accuracy(model, batch, 'channels_last', max_logit_diff=1e-4, min_top1_agreement=1.0)
+        
+        if best['batch_size'] == 8 and fallback['batch_size'] == 1 and not strict['ok'] and layout['ok']:
+            print("✓ Tuner respects the latency bound and rejects inaccurate backends")
+            return True
+        else:
+            print(f"✗ Unexpected selection: {best}, fallback {fallback}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to select tuning configuration: {e}")
+        return False
+
+def test_checkpoint_resume():
+    """Test that a bulk-run checkpoint survives a torn final line."""
+    print("\nTesting bulk checkpoint resume...")
+    
+    try:
+        import tempfile
+        import torch
+        from bulk_classify import Checkpoint, ResultWriter, run
+        from inference import Classifier
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.jsonl.checkpoint')
+            checkpoint = Checkpoint(path)
+            checkpoint.record(['a.jpg', 'b.jpg'], 120)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('{"offset": 240, "paths": ["c.j')  # Killed mid-write
+            
+            resumed = Checkpoint(path)
+            resumed.load()
+            
+            # Results file deleted since the checkpoint was written
+            try:
+                ResultWriter(os.path.join(tmp, 'results.jsonl'), resume_offset=resumed.offset)
+                refused = False
+            except ValueError:
+                refused = True
+            
+            # An invalid top_k is refused before any output or checkpoint is written
+            output = os.path.join(tmp, 'bad.jsonl')
+            classifier = Classifier(model=torch.nn.Identity(), class_names=['a', 'b'], config={})
+            try:
+                run(classifier, [tmp], output, top_k=0)
+            except ValueError:
+                refused = refused and not os.path.exists(output) and not os.path.exists(output + '.checkpoint')
+            else:
+                refused = False
+        
+        if not checkpoint.processed and resumed.processed == {'a.jpg', 'b.jpg'} and resumed.offset == 120 and refused:
+            print("✓ Checkpoint resumes from the last complete batch")
+            return True
+        else:
+            print(f"✗ Unexpected checkpoint state: {resumed.processed}, offset {resumed.offset}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to resume checkpoint: {e}")
+        return False
+
+def test_metrics_rendering():
+    """Test that histograms render cumulative Prometheus buckets."""
+    print("\nTesting metrics rendering...")
+    
+    try:
+        from metrics import Registry
+        registry = Registry()
+        latency = registry.histogram('test_latency_seconds', "Test latency", ['stage'], buckets=(0.1, 1.0))
+        latency.labels(stage='forward').observe(0.05)
+        latency.labels(stage='forward').observe(0.5)
+        text = registry.render()
+        
+        expected = [
+            'test_latency_seconds_bucket{stage="forward",le="0.1"} 1',
+            'test_latency_seconds_bucket{stage="forward",le="1"} 2',
+            'test_latency_seconds_bucket{stage="forward",le="+Inf"} 2',
+            'test_latency_seconds_count{stage="forward"} 2',
+        ]
+        missing = [line for line in expected if line not in text]
+        if not missing:
+            print("✓ Metrics render in the Prometheus text format")
+            return True
+        else:
+            print(f"✗ Missing metric lines: {missing}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to render metrics: {e}")
+        return False
+
+def test_load_corpus_determinism():
+    """Test that load-test images depend only on the seed and their index."""
+    print("\nTesting load corpus generation...")
+    
+    try:
+        from generate_load_corpus import CorpusSpec, iter_images
+        spec = CorpusSpec(4, seed=7, resolutions='64x48', formats='jpeg:1,png:1')
+        full = list(iter_images(spec))
+        tail = list(iter_images(spec, start=2))
+        
+        if len(full) == 4 and full[2:] == tail and all(m['width'] == 64 for _, m in full):
+            print("✓ Corpus images are reproducible from their seed and index")
+            return True
+        else:
+            print("✗ Corpus images differ between runs")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to generate corpus images: {e}")
+        return False
+
+def test_watch_index():
+    """Test that the watch index skips touched files but catches modified ones."""
+    print("\nTesting watch index...")
+    
+    try:
+        import tempfile
+        import torch
+        from watch_folders import FileIndex
+        with tempfile.TemporaryDirectory() as tmp:
+            image_path = os.path.join(tmp, 'frame.jpg')
+            with open(image_path, 'wb') as f:
+                f.write(b'frame-1')
+            index = FileIndex(os.path.join(tmp, 'index.sqlite'))
+            current, digest = index.is_current(image_path, 7, 100)
+            index.record(image_path, 7, 100, digest, {'path': image_path})
+            
+            touched, _ = index.is_current(image_path, 7, 200)  # New mtime, same contents
+            with open(image_path, 'wb') as f:
+                f.write(b'frame-2')
+            modified, _ = index.is_current(image_path, 7, 300)
+            
+            # Files that fail to decode stay out of the index so they are retried
+            from bulk_classify import ResultWriter
+            from inference import Classifier
+            from watch_folders import FolderWatcher
+            classifier = Classifier(model=torch.nn.Identity(), class_names=['frame'], config={})
+            writer = ResultWriter(os.path.join(tmp, 'results.jsonl'))
+            watcher = FolderWatcher(classifier, [tmp], index, writer, use_inotify=False)
+            watcher.process([(image_path, 7, 300)])
+            retried = index.lookup(image_path)[1] != 300
+            watcher.close()
+            writer.close()
+            index.close()
+        
+        if not current and touched and not modified and retried:
+            print("✓ Index detects real changes by content hash")
+            return True
+        else:
+            print(f"✗ Unexpected index results: new={current}, touched={touched}, modified={modified}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to use watch index: {e}")
+        return False
+
+def test_array_inputs():
+    """Test that decoded arrays are wrapped as CHW tensors without copying."""
+    print("\nTesting in-memory array inputs...")
+    
+    try:
+        import numpy as np
+        from inference import array_to_chw
+        pixels = np.zeros((48, 64, 3), dtype=np.uint8)
+        chw = array_to_chw(pixels)
+        gray = array_to_chw(pixels[..., 0])
+        
+        # BGR frame flipped to RGB with a negative-stride view
+        bgr = np.zeros((48, 64, 3), dtype=np.uint8)
+        bgr[..., 0] = 255
+        rgb = array_to_chw(bgr[..., ::-1])
+        flipped = rgb[2].min().item() == 255 and rgb[0].max().item() == 0
+        
+        if (tuple(chw.shape) == (3, 48, 64) and chw.data_ptr() == pixels.ctypes.data
+                and tuple(gray.shape) == (3, 48, 64) and flipped):
+            print("✓ Arrays are wrapped in place as CHW tensors")
+            return True
+        else:
+            print(f"✗ Unexpected tensor: shape {tuple(chw.shape)}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to wrap array input: {e}")
+        return False
+
+def test_priority_scheduler():
+    """Test that interactive work jumps ahead of queued bulk work without starving it."""
+    print("\nTesting priority scheduler...")
+    
+    try:
+        from scheduler import PriorityScheduler, INTERACTIVE, BULK
+        
+        class BatchOfEight:
+            batch_size = 8
+            class_names = ['class'] * 10
+        
+        scheduler = PriorityScheduler(BatchOfEight(), max_bulk_wait=5.0, start=False)
+        scheduler.map(range(20), BULK)
+        scheduler.submit('upload', INTERACTIVE)
+        first = [job.item for job in scheduler.next_batch()]
+        second = [job.item for job in scheduler.next_batch()]
+        
+        scheduler.map(['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'], INTERACTIVE)
+        starved = [job.item for job in scheduler.next_batch(now=scheduler.queues[BULK][0].enqueued + 10)]
+        
+        # An old backlog with nothing interactive queued still follows the bulk batch limit
+        scheduler.queues[INTERACTIVE].clear()
+        scheduler.seconds_per_image = 0.05  # Five images fit in max_interactive_delay
+        backlog = [job.item for job in scheduler.next_batch(now=scheduler.queues[BULK][0].enqueued + 10)]
+        scheduler.seconds_per_image = 1.0
+        slow_backlog = [job.item for job in scheduler.next_batch(now=scheduler.queues[BULK][0].enqueued + 10)]
+        
+        # A bad top_k is refused up front instead of failing other clients' batch
+        rejected = 0
+        for top_k in (0, 11):
+            try:
+                scheduler.submit('bad', INTERACTIVE, top_k)
+            except ValueError:
+                rejected += 1
+        
+        if (first == ['upload'] and second == [0] and starved == ['a', 'b', 'c', 'd', 'e', 'f', 1, 2]
+                and backlog == [3, 4, 5, 6, 7] and slow_backlog == [8] and rejected == 2 and not scheduler.queues[INTERACTIVE]):
+            print("✓ Interactive items go first and starved bulk items get reserved slots")
+            return True
+        else:
+            print(f"✗ Unexpected batches: {first}, {second}, {starved}, {backlog}, {slow_backlog}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to schedule batches: {e}")
+        return False
+
+def test_cli_client_is_lightweight():
+    """Test that the command-line client starts without importing torch."""
+    print("\nTesting command-line client imports...")
+    
+    try:
+        import subprocess
+        check = "import sys, recognition_cli; print('torch' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        
+        if output == 'False':
+            print("✓ Client leaves model loading to the daemon")
+            return True
+        else:
+            print(f"✗ Client imported torch (output: {output!r})")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to check client imports: {e}")
+        return False
+
+def test_cli_reports_dropped_connection():
+    """Test that unanswered images fail, and an unanswered connection is retried once."""
+    print("\nTesting dropped daemon connections...")
+    
+    try:
+        import json
+        import socket
+        import tempfile
+        import threading
+        import recognition_cli
+        
+        def run_cli(answers_per_connection):
+            """Run the CLI against a fake daemon that answers the given number of lines per connection."""
+            with tempfile.TemporaryDirectory() as tmp:
+                socket_path = os.path.join(tmp, 'daemon.sock')
+                listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                listener.bind(socket_path)
+                listener.listen(1)
+                
+                def serve():
+                    for answers in answers_per_connection:
+                        conn, _ = listener.accept()
+                        with conn, conn.makefile('rb') as reader, conn.makefile('wb') as writer:
+                            for _ in range(answers):
+                                reader.readline()
+                                writer.write(json.dumps({'prediction': 'cat (90.0%)'}).encode('utf-8') + b'\n')
+                            writer.flush()
+                
+                server = threading.Thread(target=serve)
+                server.start()
+                # The fake daemon is already listening, so "starting" one just reconnects
+                start_daemon = recognition_cli.start_daemon
+                recognition_cli.start_daemon = lambda path, idle_timeout: recognition_cli.connect(path)
+                try:
+                    status = recognition_cli.main(['a.jpg', 'b.jpg', '--socket', socket_path])
+                finally:
+                    recognition_cli.start_daemon = start_daemon
+                server.join()
+                listener.close()
+            return status
+        
+        partial = run_cli([1])           # Daemon died after answering one image
+        idle_exit = run_cli([0, 2])      # Daemon exited before answering anything
+        
+        if partial == 1 and idle_exit == 0:
+            print("✓ Unanswered images fail and an unanswered connection is retried")
+            return True
+        else:
+            print(f"✗ Unexpected exit codes: partial={partial}, idle exit={idle_exit}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to handle a dropped connection: {e}")
+        return False
+
+def test_workload_replay():
+    """Test that workload files round-trip and open-loop latency counts queueing delay."""
+    print("\nTesting workload replay...")
+    
+    try:
+        import json
+        import tempfile
+        import time
+        from replay_load import load_workload, run_open_loop, summarize, synthesize_workload
+        
+        class SlowTarget:
+            def send(self, request):
+                time.sleep(0.05)
+                return {'path': request['path']}
+        
+        records = synthesize_workload(['a.jpg', 'b.jpg'], rate=200.0, duration=0.1, options={'top_k': 2})
+        with tempfile.TemporaryDirectory() as tmp:
+            workload_path = os.path.join(tmp, 'workload.jsonl')
+            with open(workload_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+            entries = load_workload(workload_path)
+        
+        # One request at a time: later arrivals queue behind earlier ones
+        report = summarize(run_open_loop(SlowTarget(), entries, max_in_flight=1), entries, 'open')
+        
+        if (len(entries) == len(records) and entries[0][0] == 0.0 and entries[0][1]['top_k'] == 2
+                and report['errors'] == 0 and report['latency_ms']['max'] > 100):
+            print(f"✓ Replayed {report['requests']} requests, max latency {report['latency_ms']['max']:.0f} ms")
+            return True
+        else:
+            print(f"✗ Unexpected replay report: {report}")
+            return False
+    except Exception as e:
+        print(f"✗ Failed to replay workload: {e}")
+        return False
+
 def main():
     """Run all tests."""
     print("Image Recognition App - Component Test")
@@ -107,7 +486,18 @@ def main():
         test_imports,
         test_model_loading,
         test_class_names,
-        test_gui_creation
+        test_gui_creation,
+        test_worker_cpu_partition,
+        test_tuning_selection,
+        test_checkpoint_resume,
+        test_metrics_rendering,
+        test_load_corpus_determinism,
+        test_watch_index,
+        test_array_inputs,
+        test_priority_scheduler,
+        test_cli_client_is_lightweight,
+        test_cli_reports_dropped_connection,
+        test_workload_replay
     ]
     
     passed = 0
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Hardware auto-tuner for the image recognition app.
+
+Runs the app's preprocessing and ResNet18 model on synthetic images over a grid
+of batch sizes, intra-op/inter-op thread counts and backends, then saves the
+configuration with the best throughput under a latency bound. load_model and
+Classifier read the saved file automatically.
+
+Backends other than eager are only considered if their outputs match eager on
+a fixed set of images: the same top-1 class and logits within a tolerance.
+Reduced-precision backends (bfloat16) are opt-in with --allow-reduced-precision.
+
+Each thread setting is measured in a fresh process, because torch only allows
+the inter-op thread count to be set once per process.
+"""
+
+import argparse
+import copy
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.models import resnet18, ResNet18_Weights
+
+from generate_load_corpus import CorpusSpec, iter_images
+from inference import BACKENDS, TUNING_CONFIG_FILE, apply_thread_settings, build_transform, prepare_model, run_model
+from metrics import percentile
+
+# Backends that compute in lower precision, only tried with --allow-reduced-precision
+REDUCED_PRECISION_BACKENDS = ('bfloat16',)
+
+
+def parse_int_list(text):
+    """Parse a comma separated list of integers, e.g. '1,2,4'."""
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def default_thread_counts():
+    """Powers of two up to the number of CPUs, plus the CPU count itself."""
+    cpus = os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    counts.append(cpus)
+    return counts
+
+
+def synthetic_images(count, size=(640, 480), seed=0):
+    """Create random RGB images to feed through the preprocessing pipeline."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    return [
+        Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), 'RGB')
+        for _ in range(count)
+    ]
+
+
+def reference_batch(count=32, seed=0):
+    """Preprocess a fixed set of structured test images into one batch for accuracy checks."""
+    spec = CorpusSpec(count, seed=seed, resolutions='320x240:1', formats='jpeg:1', orientations='1:1')
+    transform = build_transform()
+    images = [Image.open(io.BytesIO(data)).convert('RGB') for data, _ in iter_images(spec)]
+    return torch.stack([transform(image) for image in images])
+
+
+def check_backend_accuracy(model, batch, backend, max_logit_diff, min_top1_agreement):
+    """Compare a backend's logits with eager on the same batch.
+
+    Returns a dict with the largest absolute logit difference, the fraction of
+    inputs with the same top-1 class, and whether both are within tolerance.
+    """
+    expected = run_model(model, batch, 'eager')
+    actual = run_model(prepare_model(copy.deepcopy(model), backend), batch, backend)
+    logit_diff = (actual - expected).abs().max().item()
+    agreement = (actual.argmax(dim=1) == expected.argmax(dim=1)).float().mean().item()
+    return {
+        'backend': backend,
+        'max_logit_diff': logit_diff,
+        'top1_agreement': agreement,
+        'ok': logit_diff <= max_logit_diff and agreement >= min_top1_agreement,
+    }
+
+
+def accurate_backends(backends, max_logit_diff, min_top1_agreement):
+    """Return the backends whose outputs match eager closely enough with the real weights."""
+    if all(backend == 'eager' for backend in backends):
+        return list(backends)
+    try:
+        model = resnet18(weights=ResNet18_Weights.IMAGENET1K_V1).eval()
+    except Exception as e:
+        print(f"✗ Cannot load the model weights to check backend accuracy ({e}); only tuning eager")
+        return [backend for backend in backends if backend == 'eager']
+
+    print("Checking backend accuracy against eager...")
+    batch = reference_batch()
+    accepted = []
+    for backend in backends:
+        if backend == 'eager':
+            accepted.append(backend)
+            continue
+        try:
+            check = check_backend_accuracy(model, batch, backend, max_logit_diff, min_top1_agreement)
+        except Exception as e:
+            print(f"  {backend:>14}: unavailable ({e})")
+            continue
+        status = "ok" if check['ok'] else "rejected"
+        print(f"  {backend:>14}: max logit diff {check['max_logit_diff']:.4f}, "
+              f"top-1 agreement {check['top1_agreement'] * 100:.1f}% ({status})")
+        if check['ok']:
+            accepted.append(backend)
+    return accepted
+
+
+def measure(model, transform, images, batch_size, backend, iterations, warmup=2):
+    """Time preprocessing plus forward pass for batches of the given size."""
+    batch_images = [images[i % len(images)] for i in range(batch_size)]
+    latencies = []
+    for iteration in range(warmup + iterations):
+        start = time.perf_counter()
+        batch = torch.stack([transform(image) for image in batch_images])
+        run_model(model, batch, backend)
+        elapsed = time.perf_counter() - start
+        if iteration >= warmup:
+            latencies.append(elapsed)
+    median = statistics.median(latencies)
+    return {
+        'batch_size': batch_size,
+        'backend': backend,
+        'latency_ms': percentile(latencies, 0.95) * 1000,
+        'median_latency_ms': median * 1000,
+        'throughput': batch_size / median,
+    }
+
+
+def measure_thread_setting(intra_op, inter_op, batch_sizes, backends, iterations, image_size):
+    """Measure every batch size and backend for one thread setting (runs in a subprocess)."""
+    config = {'intra_op_threads': intra_op, 'inter_op_threads': inter_op}
+    apply_thread_settings(config)
+
+    # Timing doesn't depend on the weight values, so skip the weight download
+    base_model = resnet18(weights=None).eval()
+    transform = build_transform()
+    images = synthetic_images(max(batch_sizes), image_size)
+
+    results = []
+    for backend in backends:
+        try:
+            model = prepare_model(copy.deepcopy(base_model), backend)
+            for batch_size in batch_sizes:
+                result = measure(model, transform, images, batch_size, backend, iterations)
+                result.update(config)
+                results.append(result)
+        except Exception as e:
+            results.append(dict(config, backend=backend, error=str(e)))
+    return results
+
+
+def select_best(results, latency_bound_ms):
+    """Pick the highest-throughput result within the latency bound.
+
+    Falls back to the lowest-latency result if none meets the bound.
+    """
+    measured = [r for r in results if 'error' not in r]
+    if not measured:
+        return None
+    within_bound = [r for r in measured if r['latency_ms'] <= latency_bound_ms]
+    if within_bound:
+        return max(within_bound, key=lambda r: r['throughput'])
+    return min(measured, key=lambda r: r['latency_ms'])
+
+
+def tune(batch_sizes, intra_op_threads, inter_op_threads, backends, iterations=10, image_size=(640, 480)):
+    """Measure the full grid and return every result."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for intra_op in intra_op_threads:
+            for inter_op in inter_op_threads:
+                print(f"Measuring {intra_op} intra-op / {inter_op} inter-op threads...")
+                setting_results = pool.apply(
+                    measure_thread_setting,
+                    (intra_op, inter_op, batch_sizes, backends, iterations, image_size),
+                )
+                for r in setting_results:
+                    if 'error' in r:
+                        print(f"  {r['backend']:>14}: unavailable ({r['error']})")
+                    else:
+                        print(f"  {r['backend']:>14} batch {r['batch_size']:>3}: "
+                              f"{r['throughput']:8.1f} img/s, p95 {r['latency_ms']:8.1f} ms")
+                results.extend(setting_results)
+    return results
+
+
+def save_config(best, latency_bound_ms, filename=TUNING_CONFIG_FILE):
+    """Persist the chosen configuration where load_model will find it."""
+    config = {
+        'batch_size': best['batch_size'],
+        'intra_op_threads': best['intra_op_threads'],
+        'inter_op_threads': best['inter_op_threads'],
+        'backend': best['backend'],
+        'throughput': round(best['throughput'], 2),
+        'latency_ms': round(best['latency_ms'], 2),
+        'latency_bound_ms': latency_bound_ms,
+        'host': platform.node(),
+        'torch_version': torch.__version__,
+        'tuned_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+def main():
+    """Tune batch size, threads and backend for this host."""
+    parser = argparse.ArgumentParser(description="Find the fastest model settings for this host")
+    parser.add_argument('--latency-ms', type=float, default=200.0,
+                        help="upper bound on p95 batch latency in milliseconds")
+    parser.add_argument('--batch-sizes', type=parse_int_list, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--threads', type=parse_int_list, default=default_thread_counts(),
+                        help="intra-op thread counts to try")
+    parser.add_argument('--interop-threads', type=parse_int_list, default=[1, 2],
+                        help="inter-op thread counts to try")
+    parser.add_argument('--backends', type=lambda text: text.split(','), default=None,
+                        help="backends to try (default: all, bfloat16 only with --allow-reduced-precision)")
+    parser.add_argument('--allow-reduced-precision', action='store_true',
+                        help="also consider backends that compute in lower precision")
+    parser.add_argument('--max-logit-diff', type=float, default=0.25,
+                        help="largest logit difference from eager a backend may show")
+    parser.add_argument('--min-top1-agreement', type=float, default=1.0,
+                        help="fraction of reference images that must keep eager's top-1 class")
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--output', default=TUNING_CONFIG_FILE)
+    args = parser.parse_args()
+
+    if args.backends is None:
+        args.backends = [b for b in BACKENDS
+                         if args.allow_reduced_precision or b not in REDUCED_PRECISION_BACKENDS]
+    unknown = [b for b in args.backends if b not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(unknown)}")
+    reduced = [b for b in args.backends if b in REDUCED_PRECISION_BACKENDS]
+    if reduced and not args.allow_reduced_precision:
+        parser.error(f"{', '.join(reduced)} changes model numerics; pass --allow-reduced-precision to try it")
+
+    print("Image Recognition App - Hardware Auto-Tuner")
+    print("=" * 60)
+
+    backends = accurate_backends(args.backends, args.max_logit_diff, args.min_top1_agreement)
+    if not backends:
+        print("✗ No backend passed the accuracy check")
+        return 1
+
+    results = tune(args.batch_sizes, args.threads, args.interop_threads, backends, args.iterations)
+    best = select_best(results, args.latency_ms)
+
+    print("=" * 60)
+    if best is None:
+        print("✗ No configuration could be measured")
+        return 1
+    if best['latency_ms'] > args.latency_ms:
+        print(f"✗ No configuration meets {args.latency_ms:.0f} ms; using the lowest-latency one")
+
+    config = save_config(best, args.latency_ms, args.output)
+    print(f"✓ Best: batch {config['batch_size']}, {config['intra_op_threads']} intra-op / "
+          f"{config['inter_op_threads']} inter-op threads, {config['backend']} backend")
+    print(f"  {config['throughput']:.1f} img/s at p95 {config['latency_ms']:.1f} ms")
+    print(f"Saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
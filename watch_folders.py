@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Watch folders and classify new or modified images as they arrive.
+
+Uses inotify on Linux and falls back to periodic polling elsewhere. Bursts of
+writes are debounced: a file is only classified once its size and mtime have
+stayed the same for a settle period, so partially written files are skipped
+until they are complete. Ready files are classified in batches.
+
+Every processed file is recorded in a persistent SQLite index by path, size,
+mtime and content hash. After a restart, files whose size and mtime match the
+index are skipped without being read, and files that were only touched
+(same hash) are not reclassified. Files that fail to open or decode are not
+recorded, so they are tried again on their next change or the next scan.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import sqlite3
+import struct
+import sys
+import time
+
+import metrics
+from bulk_classify import IMAGE_EXTENSIONS, ResultWriter, batched, classify_batch, iter_image_files
+from inference import Classifier, check_top_k
+
+# inotify event flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+INOTIFY_EVENT = struct.Struct('iIII')
+# IN_ATTRIB catches permission changes, so files that failed to open are retried
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class InotifyWatcher:
+    """Report changed image files under the roots using Linux inotify."""
+
+    def __init__(self, roots):
+        libc_name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        self.overflowed = False
+        for root in roots:
+            self.add_tree(root)
+
+    def add_tree(self, root):
+        """Watch root and every directory below it; return image files already present."""
+        existing = []
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                print(f"✗ Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self.directories[wd] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif is_image(entry.name):
+                            existing.append(entry.path)
+            except OSError:
+                pass
+        return existing
+
+    def changes(self, timeout):
+        """Wait up to timeout seconds and return the set of changed image paths."""
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; the caller falls back to a full scan
+                self.overflowed = True
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may land in a new directory before its watch exists
+                    changed.update(self.add_tree(path))
+            elif is_image(path):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Report changed image files by comparing periodic directory scans."""
+
+    def __init__(self, roots, interval=2.0):
+        self.roots = roots
+        self.interval = interval
+        self.overflowed = False
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for root in self.roots:
+            for path in iter_image_files(root):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+        return snapshot
+
+    def changes(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self.scan()
+        changed = {path for path, state in snapshot.items() if self.snapshot.get(path) != state}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class FileIndex:
+    """Persistent record of processed files, keyed by path."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT,"
+            " result TEXT, updated REAL)"
+        )
+        self.db.commit()
+
+    def lookup(self, path):
+        """Return (size, mtime_ns, sha256) for a path, or None if it was never processed."""
+        return self.db.execute(
+            "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (path,)
+        ).fetchone()
+
+    def is_current(self, path, size, mtime_ns):
+        """Check whether a file needs no classification, hashing it only if its metadata changed.
+
+        Returns (current, sha256); sha256 is None when the file wasn't read.
+        """
+        entry = self.lookup(path)
+        if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+            return True, None
+        digest = file_hash(path)
+        if entry is not None and entry[2] == digest:
+            # Touched or rewritten with identical contents
+            self.db.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?", (size, mtime_ns, path))
+            return True, digest
+        return False, digest
+
+    def record(self, path, size, mtime_ns, sha256, result):
+        self.db.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, result, updated)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, sha256, json.dumps(result), time.time()),
+        )
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+class FolderWatcher:
+    """Debounce file changes and classify stable, unprocessed images in batches."""
+
+    def __init__(self, classifier, roots, index, writer, settle=2.0, top_k=1, use_inotify=True, poll_interval=2.0):
+        check_top_k(top_k, len(classifier.class_names))
+        self.classifier = classifier
+        self.roots = roots
+        self.index = index
+        self.writer = writer
+        self.settle = settle
+        self.top_k = top_k
+        self.pending = {}  # path -> (size, mtime_ns, time of last change)
+        self.watcher = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self.watcher = InotifyWatcher(roots)
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable ({e}), falling back to polling")
+        if self.watcher is None:
+            self.watcher = PollingWatcher(roots, poll_interval)
+
+    def mark_changed(self, paths, now):
+        for path in paths:
+            self.pending[path] = (None, None, now)
+
+    def scan_all(self, now):
+        """Queue every image under the roots whose size or mtime differs from the index."""
+        for root in self.roots:
+            for path in iter_image_files(root):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entry = self.index.lookup(path)
+                if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                    metrics.CACHE_HITS.inc()
+                    continue
+                self.pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+
+    def ready_files(self, now):
+        """Return pending files whose size and mtime held still for the settle period."""
+        ready = []
+        for path, (size, mtime_ns, since) in list(self.pending.items()):
+            if now - since < self.settle:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.pending[path]  # Deleted or renamed away
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if state != (size, mtime_ns):
+                # Still being written, or first look since the event: check again later
+                self.pending[path] = state + (now,)
+                continue
+            del self.pending[path]
+            ready.append((path,) + state)
+        return ready
+
+    def process(self, ready):
+        """Classify the ready files the index doesn't already cover."""
+        todo = []
+        for path, size, mtime_ns in ready:
+            try:
+                current, digest = self.index.is_current(path, size, mtime_ns)
+            except OSError:
+                continue
+            if current:
+                metrics.CACHE_HITS.inc()
+            else:
+                metrics.CACHE_MISSES.inc()
+                todo.append((path, size, mtime_ns, digest))
+        self.index.commit()
+
+        classified = 0
+        for batch in batched(todo, self.classifier.batch_size):
+            rows = classify_batch(self.classifier, [path for path, _, _, _ in batch], self.top_k)
+            self.writer.write_rows(rows)
+            by_path = {row['path']: row for row in rows}
+            for path, size, mtime_ns, digest in batch:
+                row = by_path.get(path)
+                if row is None or 'error' in row:
+                    # Possibly temporary (permissions, incomplete file): leave it unindexed to retry
+                    continue
+                self.index.record(path, size, mtime_ns, digest, row)
+            self.index.commit()
+            classified += len(batch)
+        return classified
+
+    def run(self, initial_scan=True):
+        """Watch until interrupted."""
+        if initial_scan:
+            # Catch up on anything that changed while we weren't running
+            self.scan_all(time.monotonic())
+        while True:
+            changed = self.watcher.changes(timeout=min(self.settle, 1.0))
+            now = time.monotonic()
+            if self.watcher.overflowed:
+                print("Event queue overflowed, rescanning")
+                self.watcher.overflowed = False
+                self.scan_all(now)
+            self.mark_changed(changed, now)
+            metrics.QUEUE_DEPTH.set(len(self.pending))
+
+            ready = self.ready_files(now)
+            if ready:
+                classified = self.process(ready)
+                if classified:
+                    print(f"Classified {classified} new or modified images")
+
+    def close(self):
+        self.watcher.close()
+
+
+def main():
+    """Watch folders and classify images incrementally."""
+    parser = argparse.ArgumentParser(description="Classify new or modified images in watched folders")
+    parser.add_argument('directories', nargs='+')
+    parser.add_argument('-o', '--output', default='watch_results.jsonl', help="JSONL or CSV file results are appended to")
+    parser.add_argument('--index', default='.watch_index.sqlite', help="persistent index of processed files")
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="seconds a file must stay unchanged before it is classified")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--poll', action='store_true', help="poll instead of using inotify")
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    parser.add_argument('--no-initial-scan', action='store_true',
+                        help="only react to new events instead of catching up on changes made while stopped")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help="address for the metrics endpoint (0.0.0.0 for all interfaces)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port, args.metrics_host)
+
+    fmt = 'csv' if args.output.lower().endswith('.csv') else 'jsonl'
+    offset = os.path.getsize(args.output) if os.path.exists(args.output) else 0
+
+    classifier = Classifier()
+    try:
+        # Before the index or results file are opened
+        check_top_k(args.top_k, len(classifier.class_names))
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+    index = FileIndex(args.index)
+    writer = ResultWriter(args.output, fmt, args.top_k, resume_offset=offset)
+    watcher = FolderWatcher(classifier, args.directories, index, writer, args.settle, args.top_k,
+                            use_inotify=not args.poll, poll_interval=args.poll_interval)
+    print(f"Watching {', '.join(args.directories)} ({type(watcher.watcher).__name__}); press Ctrl+C to stop")
+
+    try:
+        watcher.run(initial_scan=not args.no_initial_scan)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        watcher.close()
+        writer.close()
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())